@@ -0,0 +1,57 @@
+# ai_service/aggregates.py
+# Agregados del catálogo para el dashboard: histograma de precios, marcas,
+# categorías y tipos de piel. Se calculan sobre el mismo catálogo limpio que
+# usa el recomendador y se cachean por versión del catálogo.
+
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from ai_service.catalog import CATALOG_MANAGER
+
+# Bordes fijos del histograma de precios (en INR): 15 intervalos entre 0 y 500
+PRICE_HISTOGRAM_EDGES = np.linspace(0, 500, 16)
+
+CatalogAggregates = namedtuple('CatalogAggregates', [
+    'version',             # Versión del catálogo
+    'products',            # Total de productos
+    'price_counts',        # Productos por intervalo de PRICE_HISTOGRAM_EDGES
+    'brand_counts',        # Counter marca -> productos
+    'category_counts',     # Counter categoría -> productos
+    'skin_type_counts',    # Counter tipo de piel -> productos
+])
+
+
+def _category_counts(series) -> Counter:
+    """Conteo de una columna categórica con bincount sobre los códigos (sin recorrer textos)."""
+    codes = series.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+    return Counter({
+        category: int(count)
+        for category, count in zip(series.cat.categories.tolist(), counts.tolist())
+        if count
+    })
+
+
+def compute_aggregates(df, version=None) -> CatalogAggregates:
+    """Agregados de un catálogo limpio en una sola pasada por columna."""
+    if df.empty:
+        return CatalogAggregates(version, 0, np.zeros(len(PRICE_HISTOGRAM_EDGES) - 1, dtype=np.int64),
+                                 Counter(), Counter(), Counter())
+
+    price = df['Price'].to_numpy(dtype=float)
+    # Mismo recorte que tenía el dashboard: solo precios por debajo de 500
+    price_counts, _ = np.histogram(price[price < PRICE_HISTOGRAM_EDGES[-1]], bins=PRICE_HISTOGRAM_EDGES)
+
+    return CatalogAggregates(
+        version,
+        len(df),
+        price_counts,
+        _category_counts(df['Brand']),
+        _category_counts(df['Category']),
+        _category_counts(df['Skin_Type']),
+    )
+
+
+# Agregados por versión del catálogo: get_catalog_aggregates(catalog=None)
+get_catalog_aggregates = CATALOG_MANAGER.cached(lambda catalog: compute_aggregates(catalog.df, catalog.version))
@@ -0,0 +1,798 @@
+# ai_service/catalog.py
+# Carga, limpieza e indexación del catálogo de productos.
+# El catálogo publicado es un objeto inmutable (Catalog) que CatalogManager
+# reemplaza de forma atómica cuando cambia el CSV, sin reiniciar procesos.
+
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ai_service.snapshot import load_snapshot, save_snapshot, snapshot_path, source_key
+
+# Define la ruta al archivo CSV correcto
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'skincare.csv')
+
+# Varios CSV de proveedores en un solo catálogo: rutas separadas por os.pathsep
+# (':' en Linux). Sin definir, solo DATA_PATH.
+CATALOG_SOURCES = [p for p in os.environ.get('SKINFIT_CATALOG_SOURCES', '').split(os.pathsep) if p] or [DATA_PATH]
+
+# Filas por bloque al leer los CSV: la memoria de la limpieza depende de
+# este número y no del tamaño de los archivos
+CHUNK_ROWS = int(os.environ.get('SKINFIT_CATALOG_CHUNK_ROWS', 50_000))
+
+# Palabras clave por categoría, EN ORDEN DE PRIORIDAD (gana la primera categoría que coincida)
+CATEGORY_KEYWORDS = {
+    "limpiador": ["cleanser", "face wash", "limpiador", "wash", "cleansing", "gel limpiador"],
+    "exfoliante": ["exfoliant", "scrub", "exfoliante", "peeling", "gommage", "AHA", "BHA", "ácido", "salicylic"],
+    "serum": ["serum", "esencia", "concentrate", "treatment", "booster", "vitamin c", "niacinamide", "hyaluronic"],
+    "crema_hidratante": ["moisturizer", "cream", "crema", "hidratante", "lotion", "emulsion", "balm", "nourishing", "hydrating"],
+    "protector_solar": ["sunscreen", "spf", "sun protection", "protector solar", "block", "shield", "sunblock"],
+    "mascarilla": ["mask", "mascarilla", "treatment mask", "sheet mask"]
+}
+DEFAULT_CATEGORY = "crema_hidratante"
+
+def compile_category_matcher(category_keywords=CATEGORY_KEYWORDS):
+    """
+    Compila las palabras clave en una tupla plana de (texto, regex, categoría)
+    en orden de prioridad, para comparar contra títulos ya en minúsculas.
+    - Las siglas en mayúsculas (AHA, BHA) se buscan como palabra completa.
+    - Se descartan las palabras que contienen otra de igual o mayor prioridad
+      (ej: "face wash" ya queda cubierta por "wash"), porque nunca deciden.
+    """
+    entries = []
+    for rank, (category, keywords) in enumerate(category_keywords.items()):
+        for keyword in dict.fromkeys(keywords):
+            needle = keyword.lower()
+            word_re = re.compile(rf'\b{re.escape(needle)}\b') if keyword.isupper() else None
+            entries.append((rank, needle, word_re, category))
+    
+    matchers = []
+    for rank, needle, word_re, category in entries:
+        shadowed = any(
+            other_re is None and other in needle and (other != needle or other_rank < rank)
+            for other_rank, other, other_re, _ in entries
+            if other_rank <= rank and (other, other_rank) != (needle, rank)
+        )
+        if not shadowed:
+            matchers.append((needle, word_re, category))
+    return tuple(matchers)
+
+CATEGORY_MATCHER = compile_category_matcher()
+
+def _match_category(title_lower: str) -> str:
+    """Devuelve la categoría de un título ya en minúsculas."""
+    for needle, word_re, category in CATEGORY_MATCHER:
+        if needle in title_lower and (word_re is None or word_re.search(title_lower)):
+            return category
+    return DEFAULT_CATEGORY
+
+def infer_product_category(title):
+    """
+    Infiere la categoría del producto basándose en palabras clave en el título.
+    """
+    if not isinstance(title, str):
+        return DEFAULT_CATEGORY  # Default category
+    
+    return _match_category(title.lower())
+
+def infer_product_categories(titles):
+    """
+    Versión vectorizada de infer_product_category para toda la columna Title:
+    pasa a minúsculas una sola vez y clasifica cada título distinto una sola vez.
+    Sigue siendo un bucle de Python por título distinto: unos 0.6-0.8 s con
+    100k títulos distintos y 0.9-1.2 s con 150k. Una sola regex combinada
+    (finditer o extractall sobre los títulos unidos) o una búsqueda por
+    palabra clave con numpy resultaron 2-5 veces más lentas que `in`.
+    """
+    titles_lower = titles.fillna('').astype(str).str.lower()
+    codes, uniques = pd.factorize(titles_lower)
+    categories = np.array([_match_category(title) for title in uniques], dtype=object)
+    return pd.Series(categories[codes], index=titles.index)
+
+# Imágenes de respaldo y patrón de ASIN (Amazon Standard Identification Number)
+NO_IMAGE_URL = "https://via.placeholder.com/200x200/667eea/ffffff?text=Sin+Imagen"
+PRODUCT_IMAGE_URL = "https://via.placeholder.com/200x200/667eea/ffffff?text=Producto"
+ASIN_PATTERN = r'/([A-Z0-9]{10})(?:[/?]|$)'
+
+# Los enlaces patrocinados llevan la ruta del producto codificada en un
+# parámetro (url=%2FNombre%2Fdp%2FB00E96N6O8%2F...): se decodifica '/' antes
+# de buscar el ASIN
+_ENCODED_SLASH_RE = re.compile(r'%2f', re.IGNORECASE)
+_LINK_HOST_PATTERN = r'^(https?://[^/?#]+)'
+
+def _decode_slashes(url: str) -> str:
+    return _ENCODED_SLASH_RE.sub('/', url)
+
+def extract_asins(links):
+    """ASIN de cada enlace de la columna Link (NaN si no tiene)."""
+    decoded = links.fillna('').astype(str).str.replace(_ENCODED_SLASH_RE, '/', regex=True)
+    return decoded.str.extract(ASIN_PATTERN, expand=False)
+
+def canonical_links(links, asins):
+    """
+    Enlace corto y estable de cada producto: https://<dominio>/dp/<ASIN>.
+    Los enlaces sin ASIN (o sin dominio) se dejan como estaban.
+    """
+    hosts = links.str.extract(_LINK_HOST_PATTERN, expand=False)
+    canonical = hosts + '/dp/' + asins
+    return canonical.where(canonical.notna(), links)
+
+def extract_amazon_image(amazon_url):
+    """
+    Intenta extraer la imagen de un producto de Amazon de la URL.
+    Devuelve una URL de imagen o una imagen por defecto.
+    """
+    if not amazon_url or amazon_url == '#':
+        return NO_IMAGE_URL
+    
+    try:
+        # Para enlaces de Amazon, podemos intentar construir la URL de imagen
+        # Basado en el ASIN (Amazon Standard Identification Number)
+        
+        # Extraer ASIN del URL de Amazon (patrón común)
+        match = re.search(ASIN_PATTERN, _decode_slashes(amazon_url))
+        
+        if match:
+            asin = match.group(1)
+            # Construir URL de imagen usando el ASIN
+            image_url = f"https://images-na.ssl-images-amazon.com/images/P/{asin}.01._SCLZZZZZZZ_.jpg"
+            return image_url
+        else:
+            # Si no podemos extraer ASIN, usar imagen por categoría
+            return PRODUCT_IMAGE_URL
+            
+    except Exception as e:
+        print(f"⚠️ Error extrayendo imagen de Amazon: {e}")
+    
+    # Imagen por defecto
+    return "https://via.placeholder.com/200x200/667eea/ffffff?text=SkinFit"
+
+# Columnas del CSV que usan el recomendador y las plantillas; el resto
+# (Product, Sold By, Number of items, índice) no se carga
+CATALOG_COLUMNS = ['Title', 'Brand', 'Skin_Type', 'Price', 'Link']
+
+# Todas se leen como texto; clean_catalog convierte Price (así un precio
+# mal escrito no hace fallar la lectura ni cambia el tipo de un bloque)
+CSV_DTYPES = {column: str for column in CATALOG_COLUMNS}
+
+# Columnas con pocos valores distintos: se guardan como categóricas
+# (un código por fila + cada texto una sola vez)
+CATEGORICAL_COLUMNS = ['Category', 'Skin_Type', 'Brand']
+
+IMAGE_URL_TEMPLATE = "https://images-na.ssl-images-amazon.com/images/P/{}.01._SCLZZZZZZZ_.jpg"
+
+def compact_catalog(df):
+    """
+    Deja solo las columnas del catálogo limpio (CATALOG_COLUMNS + Category y
+    ASIN) y convierte CATEGORICAL_COLUMNS a categóricas. Si ya es compacto,
+    no copia nada.
+    """
+    columns = [c for c in CATALOG_COLUMNS + ['Category', 'ASIN'] if c in df.columns]
+    if list(df.columns) != columns:
+        df = df[columns]
+    converted = {
+        column: df[column].astype('category')
+        for column in CATEGORICAL_COLUMNS
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**converted) if converted else df
+
+def _price_fields(price) -> tuple:
+    """(price_display, price_usd, price_cop, price_inr) de un precio en INR."""
+    if price != price or price == 0:  # Sin precio (NaN o 0)
+        return "Consultar precio", "Consultar precio", "Consultar precio", '₹' + str(price)
+    # Conversiones aproximadas: 1 INR = 0.012 USD, 1 USD = 4000 COP
+    usd = price * 0.012
+    price_usd = '${:.2f}'.format(usd)
+    return price_usd + ' USD', price_usd, '${:,.0f} COP'.format(usd * 4000), '₹' + str(price)
+
+class ProductRecords:
+    """
+    Registros para el frontend, indexados por posición de fila.
+    En vez de guardar un diccionario por producto, guarda los campos de
+    presentación ya calculados (una vez por catálogo) en arrays de solo
+    lectura y arma el diccionario al pedirlo: servir un producto es leer
+    posiciones, sin formatear precios ni armar URLs, y cada llamada devuelve
+    un diccionario nuevo que el llamador puede modificar.
+    Los textos de precio van como categóricas: hay muchos menos precios
+    distintos que productos.
+    """
+    
+    def __init__(self, df):
+        self._size = len(df)
+        if df.empty:
+            return
+        titles = df['Title'].to_numpy(dtype=object)
+        links = df['Link'].to_numpy(dtype=object)
+        asins = df['ASIN'].to_numpy(dtype=object)
+        
+        # Los títulos cortos se comparten con el catálogo; solo se copian los recortados
+        self._names = read_only(np.array(
+            [title if len(title) <= 80 else title[:77] + "..." for title in titles.tolist()], dtype=object
+        ))
+        self._links = read_only(links)
+        # Clave estable del producto entre versiones del catálogo (None si el enlace no trae ASIN)
+        self._asins = read_only(np.where(pd.isna(asins), None, asins))
+        
+        # El ASIN se extrajo una sola vez al cargar: aquí no hay regex
+        self._image_urls = read_only(np.array([
+            NO_IMAGE_URL if link in ('', '#')
+            else IMAGE_URL_TEMPLATE.format(asin) if isinstance(asin, str)
+            else PRODUCT_IMAGE_URL
+            for link, asin in zip(links.tolist(), asins.tolist())
+        ], dtype=object))
+        
+        price_codes, prices = pd.factorize(df['Price'].to_numpy(), use_na_sentinel=False)
+        self._price_codes = read_only(price_codes.astype(np.int32))
+        self._prices = [_price_fields(price) for price in prices]
+        self._brand_codes = read_only(df['Brand'].cat.codes.to_numpy())
+        self._brands = df['Brand'].cat.categories.tolist()
+        self._category_codes = read_only(df['Category'].cat.codes.to_numpy())
+        self._categories = df['Category'].cat.categories.tolist()
+    
+    def __len__(self):
+        return self._size
+    
+    def __iter__(self):
+        return (self[position] for position in range(self._size))
+    
+    def __getitem__(self, position) -> dict:
+        if not -self._size <= position < self._size:
+            raise IndexError(position)
+        price_display, price_usd, price_cop, price_inr = self._prices[self._price_codes[position]]
+        return {
+            'product_name': self._names[position],
+            'brand': self._brands[self._brand_codes[position]],
+            'link': self._links[position],
+            'price_display': price_display,
+            'price_usd': price_usd,
+            'price_cop': price_cop,
+            'price_inr': price_inr,
+            'category': self._categories[self._category_codes[position]],
+            'image_url': self._image_urls[position],
+            'asin': self._asins[position]
+        }
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes propios (arrays y textos de presentación, sin los textos compartidos con el catálogo)."""
+        if not self._size:
+            return 0
+        arrays = sum(a.nbytes for a in (self._names, self._links, self._asins, self._image_urls, self._price_codes,
+                                        self._brand_codes, self._category_codes))
+        own_names = sum(sys.getsizeof(name) for name in self._names.tolist() if name.endswith("..."))
+        return (arrays + own_names + sum(map(sys.getsizeof, self._image_urls.tolist()))
+                + sum(sys.getsizeof(text) for fields in self._prices for text in fields))
+
+def read_only(array):
+    """Marca un array como de solo lectura (compartido entre peticiones y workers) y lo devuelve."""
+    array.flags.writeable = False
+    return array
+
+# Mapeo de tipos de piel (Español → Inglés) usado para filtrar el catálogo
+SKIN_TYPE_MAPPING = {
+    'seca': ['dry', 'very dry', 'all'],
+    'mixta': ['combination', 'normal', 'all'],
+    'grasa': ['oily', 'acne', 'acne prone', 'all'],
+    'sensible': ['sensitive', 'all'],
+    'normal': ['normal', 'all']
+}
+
+# Palabras clave por preocupación (búsqueda en títulos)
+CONCERN_KEYWORDS = {
+    'acne': ['acne', 'pimple', 'oil-free', 'salicylic', 'tea tree', 'breakout', 'blemish', 'acne prone'],
+    'manchas': ['bright', 'glow', 'vitamin c', 'pigmentation', 'radiance', 'lightening', 'dark spot', 'brightening'],
+    'arrugas': ['anti-aging', 'wrinkle', 'firming', 'retinol', 'peptide', 'anti age', 'anti-wrinkle', 'firming'],
+    'seca': ['hydrating', 'moisturizing', 'dry skin', 'hydration', 'moisture', 'nourishing', 'dry'],
+    'sensible': ['sensitive', 'calming', 'gentle', 'soothing', 'fragrance-free', 'hypoallergenic']
+}
+
+# Columna de cada preocupación en la matriz index['concern_hits']
+CONCERN_COLUMNS = {concern: column for column, concern in enumerate(CONCERN_KEYWORDS)}
+
+def concern_columns(concerns) -> list:
+    """Columnas de index['concern_hits'] de las preocupaciones conocidas (en orden estable)."""
+    return sorted(CONCERN_COLUMNS[concern] for concern in concerns if concern in CONCERN_COLUMNS)
+
+def _category_mask(series, term: str):
+    """
+    Filas de una columna categórica que contienen `term` (sin distinguir
+    mayúsculas): la búsqueda se hace sobre las categorías distintas y se
+    expande con los códigos, sin recorrer cada fila.
+    """
+    categories = series.cat.categories.astype(str).str.lower()
+    hit = np.append(np.asarray(categories.str.contains(term, regex=False), dtype=bool), False)
+    return hit[series.cat.codes.to_numpy()]  # Código -1 (sin valor) → último elemento, False
+
+def build_catalog_index(df):
+    """
+    Construye el índice invertido del catálogo: categoría y tipo de piel →
+    máscara booleana de filas (solo lectura), más la matriz de coincidencias
+    productos × preocupaciones ('concern_hits', int8 con cuántas palabras
+    clave de cada preocupación aparecen en el título).
+    Se calcula una sola vez al cargar, para que cada recomendación sea un
+    AND/OR de máscaras o una reducción por filas de la matriz sin recorrer
+    columnas de texto. Al no tener un objeto de Python por fila, los procesos
+    creados con fork (serve.py) lo leen sin copiar sus páginas.
+    """
+    rows = len(df)
+    index = {
+        'all': read_only(np.ones(rows, dtype=bool)),
+        'none': read_only(np.zeros(rows, dtype=bool)),
+        'category': {},
+        'skin_type': {},
+        'concern_hits': read_only(np.zeros((rows, len(CONCERN_COLUMNS)), dtype=np.int8))
+    }
+    if df.empty:
+        return index
+
+    # Categoría → filas (comparación exacta)
+    for category, positions in df.groupby('Category', observed=True).indices.items():
+        mask = np.zeros(rows, dtype=bool)
+        mask[positions] = True
+        index['category'][category] = read_only(mask)
+
+    # Tipo de piel normalizado → filas (misma búsqueda flexible que antes)
+    skin_terms = {term for terms in SKIN_TYPE_MAPPING.values() for term in terms} | {'all'}
+    for term in skin_terms:
+        index['skin_type'][term] = read_only(_category_mask(df['Skin_Type'], term))
+
+    # Matriz de preocupaciones: los títulos se pasan a minúsculas una sola vez
+    # y cada palabra clave distinta se busca como texto literal (sin regex)
+    titles = df['Title'].fillna('').astype(str).str.lower().tolist()
+    keyword_rows = {}
+    hits = np.zeros((rows, len(CONCERN_COLUMNS)), dtype=np.int8)
+    for concern, keywords in CONCERN_KEYWORDS.items():
+        for keyword in set(keywords):
+            if keyword not in keyword_rows:
+                keyword_rows[keyword] = np.fromiter((keyword in title for title in titles), dtype=bool, count=rows)
+            hits[:, CONCERN_COLUMNS[concern]] += keyword_rows[keyword]
+    index['concern_hits'] = read_only(hits)
+
+    return index
+
+def build_ranking_features(df, index):
+    """
+    Señales del puntaje de ranking, una array por fila del catálogo (las
+    coincidencias por preocupación salen de index['concern_hits']):
+    - 'skin_tier': por tipo de piel del formulario, 2 si el producto es para
+      ese tipo específico, 1 si es para todo tipo de piel, 0 si no aplica.
+    - 'price_score': entre 0 y 1, más alto cuanto más barato; 0 sin precio.
+    """
+    rows = len(df)
+    features = {'skin_tier': {}, 'price_score': np.zeros(rows, dtype=np.float32)}
+    if df.empty:
+        return features
+
+    for skin, terms in SKIN_TYPE_MAPPING.items():
+        tier = np.zeros(rows, dtype=np.int8)
+        tier[index['skin_type']['all']] = 1
+        for term in terms:
+            if term != 'all':
+                tier[index['skin_type'][term]] = 2
+        features['skin_tier'][skin] = tier
+
+    price = pd.to_numeric(df['Price'], errors='coerce').fillna(0).to_numpy()
+    priced = price > 0
+    if priced.any():
+        # Percentil inverso del precio entre los productos con precio
+        rank = pd.Series(price[priced]).rank(method='average', pct=True).to_numpy()
+        features['price_score'][priced] = 1.0 - rank + 1.0 / priced.sum()
+
+    for array in features['skin_tier'].values():
+        read_only(array)
+    read_only(features['price_score'])
+    return features
+
+def clean_catalog(df_temp):
+    """
+    Limpia el CSV crudo e infiere la categoría de cada producto.
+    """
+    # LIMPIEZA ESPECÍFICA PARA TU CSV
+    # Tu CSV tiene: Title, Product, Category, Brand, Skin_Type, Price, Link
+    
+    # 1. Title - nombre del producto
+    if 'Title' in df_temp.columns:
+        df_temp['Title'] = df_temp['Title'].fillna('Producto sin nombre').astype(str).str.strip()
+        # Limpiar espacios extra y caracteres raros
+        df_temp['Title'] = df_temp['Title'].str.replace(r'\s+', ' ', regex=True)
+    else:
+        df_temp['Title'] = 'Producto sin nombre'
+    
+    # 2. Brand - marca
+    if 'Brand' in df_temp.columns:
+        df_temp['Brand'] = df_temp['Brand'].fillna('Marca desconocida').astype(str).str.strip()
+    else:
+        df_temp['Brand'] = 'Marca desconocida'
+    
+    # 3. Skin_Type - tipo de piel (CRÍTICO para las recomendaciones)
+    if 'Skin_Type' in df_temp.columns:
+        df_temp['Skin_Type'] = df_temp['Skin_Type'].fillna('All').astype(str)
+        # Limpiar y estandarizar tipos de piel
+        df_temp['Skin_Type'] = df_temp['Skin_Type'].str.replace('"', '').str.strip()
+        # Convertir a minúsculas para consistencia
+        df_temp['Skin_Type'] = df_temp['Skin_Type'].str.lower()
+    else:
+        df_temp['Skin_Type'] = 'all'
+    
+    # 4. Price - precio
+    if 'Price' in df_temp.columns:
+        # Limpiar precios - convertir a numérico
+        df_temp['Price'] = df_temp['Price'].fillna(0)
+        try:
+            df_temp['Price'] = pd.to_numeric(df_temp['Price'], errors='coerce').fillna(0)
+        except:
+            df_temp['Price'] = 0
+    else:
+        df_temp['Price'] = 0
+    
+    # 5. Link - enlace canónico (https://<dominio>/dp/<ASIN>) y ASIN extraído una sola vez
+    if 'Link' in df_temp.columns:
+        df_temp['Link'] = df_temp['Link'].fillna('#').astype(str)
+    else:
+        df_temp['Link'] = '#'
+    df_temp['ASIN'] = extract_asins(df_temp['Link'])
+    df_temp['Link'] = canonical_links(df_temp['Link'], df_temp['ASIN'])
+    
+    # 6. Category - categoría del producto (usaremos la inferida)
+    df_temp['Category'] = infer_product_categories(df_temp['Title'])
+    
+    return compact_catalog(df_temp)
+
+def _source_paths(path) -> list:
+    """Una ruta o una lista de rutas → lista de rutas."""
+    return [path] if isinstance(path, str) else list(path)
+
+def read_catalog_chunks(paths, chunksize: int = CHUNK_ROWS):
+    """
+    Lee uno o varios CSV por bloques de `chunksize` filas, solo con
+    CATALOG_COLUMNS y tipos explícitos (sin inferencia sobre todo el archivo).
+    """
+    for path in _source_paths(paths):
+        with pd.read_csv(path, usecols=lambda column: column in CATALOG_COLUMNS,
+                         dtype=CSV_DTYPES, chunksize=chunksize) as reader:
+            yield from reader
+
+def _row_keys(df):
+    """
+    Hash de 64 bits de cada producto (para descartar repetidos entre bloques):
+    el de su ASIN si lo tiene, así el mismo producto con otro enlace de
+    seguimiento, título o precio cuenta como repetido; si no, el de la fila.
+    """
+    keys = pd.util.hash_pandas_object(df[CATALOG_COLUMNS], index=False).to_numpy().copy()
+    has_asin = df['ASIN'].notna().to_numpy()
+    if has_asin.any():
+        keys[has_asin] = pd.util.hash_pandas_object(df['ASIN'][has_asin], index=False).to_numpy()
+    return keys
+
+def concat_catalog_chunks(chunks):
+    """
+    Une bloques ya compactos. Las categóricas se unen con sus códigos
+    (union_categoricals), sin pasar por texto fila a fila; las columnas de
+    texto solo copian referencias a los mismos objetos.
+    """
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[column] = pd.api.types.union_categoricals(parts, sort_categories=True)
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+def load_catalog_sources(paths, chunksize: int = CHUNK_ROWS):
+    """
+    Carga uno o varios CSV en streaming: cada bloque se limpia, se categoriza
+    y se compacta por separado, y se descartan los productos ya vistos (mismo
+    ASIN, o misma fila si no tiene, en el mismo bloque o en uno anterior).
+    La memoria máxima es el catálogo limpio más un bloque crudo, sin
+    importar el tamaño de los archivos.
+    """
+    print("📦 Limpiando e infiriendo categorías por bloques...")
+    seen = set()
+    chunks = []
+    rows_read = 0
+    for raw in read_catalog_chunks(paths, chunksize):
+        rows_read += len(raw)
+        chunk = clean_catalog(raw)
+        keys = _row_keys(chunk)
+        fresh = ~pd.Series(keys).duplicated().to_numpy()
+        fresh &= np.fromiter((key not in seen for key in keys.tolist()), dtype=bool, count=len(keys))
+        seen.update(keys[fresh].tolist())
+        if not fresh.all():
+            chunk = chunk[fresh]
+        chunks.append(chunk.reset_index(drop=True))
+    
+    # Verificar que el archivo no esté vacío
+    if not rows_read:
+        raise ValueError("El archivo CSV está vacío")
+    
+    df = concat_catalog_chunks(chunks)
+    print(f"✅ CSV cargado: {rows_read} filas leídas, {len(df)} productos ({rows_read - len(df)} repetidos)")
+    return df
+
+def load_catalog_dataframe(path=DATA_PATH, use_snapshot: bool = True, key: str = None,
+                           chunksize: int = CHUNK_ROWS):
+    """
+    Devuelve el catálogo limpio y categorizado de uno o varios CSV. Si existe
+    una instantánea binaria de los mismos CSV (mismo hash) se usa
+    directamente; si no, se cargan por bloques y se guarda la instantánea
+    (junto al primer CSV) para los siguientes procesos.
+    """
+    paths = _source_paths(path)
+    if use_snapshot and key is None:
+        key = source_key(paths)
+    if use_snapshot:
+        df_snapshot = load_snapshot(paths[0], key)
+        if df_snapshot is not None:
+            print(f"⚡ Catálogo cargado desde instantánea: {snapshot_path(paths[0])}")
+            return df_snapshot
+    
+    df_temp = load_catalog_sources(paths, chunksize)
+    
+    if use_snapshot:
+        save_snapshot(paths[0], df_temp, key)
+    return df_temp
+
+
+def build_asin_index(df):
+    """
+    (ASIN ordenados, posición de cada uno): la búsqueda por ASIN es un
+    searchsorted sobre arrays de solo lectura, sin un diccionario por producto.
+    """
+    if df.empty or 'ASIN' not in df.columns:
+        return read_only(np.array([], dtype=str)), read_only(np.zeros(0, dtype=np.int64))
+    asins = df['ASIN'].to_numpy(dtype=object)
+    positions = np.flatnonzero(pd.notna(asins))
+    asins = np.array(asins[positions].tolist(), dtype=str)
+    order = np.argsort(asins, kind='stable')
+    return read_only(asins[order]), read_only(positions[order])
+
+
+class Catalog:
+    """
+    Versión publicada del catálogo: tabla limpia y compacta, índice invertido,
+    señales de ranking y registros para el frontend. No se modifica nunca
+    después de construirse; una recarga crea un Catalog nuevo.
+    """
+    
+    def __init__(self, df, version: int = 0, source: str = None, source_key: str = None):
+        df = compact_catalog(df)
+        self.df = df
+        self.index = build_catalog_index(df)
+        self.ranking = build_ranking_features(df, self.index)
+        self.records = ProductRecords(df)
+        self._asin_index = build_asin_index(df)
+        self.memory_bytes = self._memory_bytes()
+        self.version = version
+        self.source = source
+        self.source_key = source_key
+        self.load_seconds = 0.0
+        self.loaded_at = datetime.now()
+    
+    def __len__(self):
+        return len(self.df)
+    
+    def position_of(self, asin: str) -> int:
+        """Posición en esta versión del producto con ese ASIN (KeyError si no está)."""
+        asins, positions = self._asin_index
+        i = int(np.searchsorted(asins, asin))
+        if i < len(asins) and asins[i] == asin:
+            return int(positions[i])
+        raise KeyError(asin)
+    
+    def _memory_bytes(self) -> int:
+        """Memoria aproximada del catálogo: tabla, arrays de ranking y registros."""
+        total = int(self.df.memory_usage(deep=True).sum()) if not self.df.empty else 0
+        groups = [self.ranking['skin_tier'], self.index['category'], self.index['skin_type']]
+        for group in groups:
+            total += sum(array.nbytes for array in group.values())
+        total += self.index['concern_hits'].nbytes + self.ranking['price_score'].nbytes + self.records.nbytes
+        total += sum(array.nbytes for array in self._asin_index)
+        return total
+
+
+class CatalogManager:
+    """
+    Mantiene el catálogo vigente y lo recarga cuando cambia el archivo fuente.
+    La tabla nueva y sus índices se construyen aparte y se publican con una
+    sola asignación, así que una petición en curso (que leyó `current` al
+    empezar) nunca ve un catálogo a medio construir.
+    """
+    
+    def __init__(self, path):
+        self.path = path  # Una ruta o una lista de rutas (varios proveedores)
+        self.current = Catalog(pd.DataFrame())
+        self.last_error = None
+        self._fingerprint = None  # (mtime_ns, tamaño) de cada CSV cargado
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._poll_thread = None
+        self._poll_stop = threading.Event()
+        self.poll_interval = None
+        # Proceso que revisa el CSV en lugar de este (el padre de serve.py), o None
+        self.external_poller = None
+    
+    def add_listener(self, callback):
+        """Registra una función callback(catalog) que se llama tras cada cambio."""
+        self._listeners.append(callback)
+    
+    def cached(self, build):
+        """
+        Valor derivado del catálogo (agregados, índices...) que se calcula con
+        build(catalog) una vez por versión. Devuelve la función get(catalog=None)
+        que lo lee. Se recalcula al publicar cada versión, en el orden en que
+        se registró, así la primera petición después de una recarga no espera.
+        """
+        cache = VersionedCache(build)
+        self.add_listener(cache.get)
+        return cache.get
+    
+    def install(self, df, source_key: str = None) -> Catalog:
+        """Construye un Catalog a partir de una tabla ya limpia y lo publica."""
+        start = time.perf_counter()
+        with self._reload_lock:
+            catalog = self._build(df, source_key, start)
+            self._publish(catalog)
+            return catalog
+    
+    def _build(self, df, key, start) -> Catalog:
+        catalog = Catalog(df, self.current.version + 1, self.path, key)
+        catalog.load_seconds = time.perf_counter() - start
+        return catalog
+    
+    def _publish(self, catalog: Catalog):
+        # Una sola asignación: las peticiones ven el catálogo viejo o el nuevo, nunca uno a medias
+        self.current = catalog
+        for callback in self._listeners:
+            callback(catalog)
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        Recarga el catálogo si el CSV cambió (o siempre, con force=True).
+        Devuelve True si se publicó una versión nueva. Los errores se propagan
+        y el catálogo anterior sigue vigente.
+        """
+        with self._reload_lock:
+            fingerprint = tuple(
+                (stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, _source_paths(self.path))
+            )
+            if not force and fingerprint == self._fingerprint:
+                return False
+            
+            key = source_key(self.path)
+            if not force and key == self.current.source_key:
+                self._fingerprint = fingerprint  # Solo cambió la fecha
+                return False
+            
+            start = time.perf_counter()
+            df = load_catalog_dataframe(self.path, key=key)
+            
+            # Mostrar distribución de categorías
+            category_counts = df['Category'].value_counts()
+            print("📊 Distribución de categorías inferidas:")
+            for category, count in category_counts.items():
+                print(f"   {category}: {count} productos")
+            
+            # Índice invertido y campos de presentación
+            print("🗂️  Construyendo índice del catálogo...")
+            self._publish(self._build(df, key, start))
+            self._fingerprint = fingerprint
+            self.last_error = None
+            return True
+    
+    def start_polling(self, interval: float = 30.0):
+        """Revisa el CSV cada `interval` segundos en un hilo de fondo."""
+        if self._poll_thread is not None:
+            return
+        self.poll_interval = interval
+        self._poll_stop.clear()
+        self._poll_thread = threading.Thread(target=self._poll_loop, name='catalog-poller', daemon=True)
+        self._poll_thread.start()
+    
+    def stop_polling(self):
+        if self._poll_thread is None:
+            return
+        self._poll_stop.set()
+        self._poll_thread.join()
+        self._poll_thread = None
+    
+    def _poll_loop(self):
+        while not self._poll_stop.wait(self.poll_interval):
+            try:
+                if self.reload():
+                    print(f"🔄 Catálogo recargado: versión {self.current.version} con {len(self.current)} productos")
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ ERROR al recargar el catálogo (se mantiene la versión {self.current.version}): {e}")
+    
+    def status(self) -> dict:
+        """
+        Versión, momento y duración de la carga del catálogo vigente. La fuente
+        va solo con los nombres de archivo, sin las rutas del servidor.
+        """
+        catalog = self.current
+        poller = 'thread' if self._poll_thread is not None else self.external_poller
+        return {
+            'version': catalog.version,
+            'source': os.pathsep.join(map(os.path.basename, _source_paths(catalog.source))) if catalog.source else None,
+            'source_key': catalog.source_key,
+            'products': len(catalog),
+            'memory_bytes': catalog.memory_bytes,
+            'loaded_at': catalog.loaded_at.isoformat(timespec='seconds'),
+            'load_seconds': round(catalog.load_seconds, 4),
+            'polling': poller is not None,
+            'poller': poller,
+            'poll_interval': self.poll_interval,
+            'last_error': self.last_error
+        }
+
+
+class VersionedCache:
+    """
+    Valor derivado del catálogo vigente (agregados, índices...) calculado con
+    build(catalog) y cacheado por versión: se recalcula solo cuando cambia la
+    versión. El valor construido debe tener un atributo `version`.
+    También se conserva el de la versión anterior: las peticiones que
+    empezaron justo antes de una recarga lo siguen leyendo sin reconstruirlo.
+    """
+    
+    def __init__(self, build):
+        self._build = build
+        self._current = None
+        self._previous = None
+        self._lock = threading.Lock()
+    
+    def _cached(self, version):
+        for value in (self._current, self._previous):
+            if value is not None and value.version == version:
+                return value
+        return None
+    
+    def get(self, catalog=None):
+        if catalog is None:
+            catalog = get_catalog()
+        value = self._cached(catalog.version)
+        if value is not None:
+            return value
+        with self._lock:
+            value = self._cached(catalog.version)
+            if value is not None:
+                return value
+            value = self._build(catalog)
+            if self._current is None or catalog.version > self._current.version:
+                self._previous, self._current = self._current, value
+            elif self._previous is None or catalog.version > self._previous.version:
+                # Un catálogo anterior no reemplaza al vigente, pero sí queda cacheado
+                self._previous = value
+            return value
+
+
+CATALOG_MANAGER = CatalogManager(CATALOG_SOURCES[0] if len(CATALOG_SOURCES) == 1 else CATALOG_SOURCES)
+
+def get_catalog() -> Catalog:
+    """Catálogo vigente. Léelo una vez por petición y úsalo de principio a fin."""
+    return CATALOG_MANAGER.current
+
+try:
+    # Intenta cargar el dataset
+    print(f"🔍 Cargando dataset desde: {os.pathsep.join(CATALOG_SOURCES)}")
+    CATALOG_MANAGER.reload()
+    print(f"✅ Sistema de recomendación listo con {len(get_catalog())} productos")
+    
+except FileNotFoundError:
+    print(f"❌ ERROR: Archivo no encontrado en: {DATA_PATH}")
+    print("   Verifica que 'skincare.csv' esté en la carpeta 'data'")
+except pd.errors.EmptyDataError:
+    print("❌ ERROR: El archivo CSV está vacío")
+except Exception as e:
+    CATALOG_MANAGER.last_error = str(e)
+    print(f"❌ ERROR inesperado al cargar el CSV: {e}")
+    import traceback
+    traceback.print_exc()
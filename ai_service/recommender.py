@@ -1,339 +1,462 @@
 # ai_service/recommender.py (VERSIÓN FINAL FUNCIONAL)
 
-import pandas as pd
-import os
+import logging
 import random
-import re
+import threading
+import zlib
+from collections import Counter, OrderedDict, namedtuple
 
-# Define la ruta al archivo CSV correcto
-DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'skincare.csv')
+import numpy as np
 
-# DEFINIR LA FUNCIÓN PRIMERO, ANTES DE CUALQUIER USO
-def infer_product_category(title):
+# La carga e indexación del catálogo vive en ai_service.catalog;
+# se reexportan aquí los nombres que ya usaban otros módulos.
+from ai_service.catalog import (
+    CATALOG_MANAGER,
+    CONCERN_KEYWORDS,
+    DATA_PATH,
+    SKIN_TYPE_MAPPING,
+    clean_catalog,
+    concern_columns,
+    extract_amazon_image,
+    get_catalog,
+    infer_product_category,
+    load_catalog_dataframe,
+)
+
+logger = logging.getLogger(__name__)
+
+class CandidateCache:
+    """
+    Caché LRU acotada de candidatos por perfil.
+    Guarda, para cada clave (versión del catálogo, tipo de piel, preocupaciones,
+    categoría), el CandidatePool con las posiciones candidatas ordenadas, y
+    para cada clave + (límite, semilla) las posiciones ya rankeadas.
+    Se limita por entradas y por bytes de posiciones, para que la memoria de
+    cada worker no crezca con el tamaño del catálogo.
+    """
+    
+    def __init__(self, maxsize: int = 1024, max_bytes: int = 32 * 2**20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # clave -> (valor, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Devuelve el valor guardado (y lo marca como reciente) o None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, value):
+        """Guarda un valor, descartando los menos usados si se supera el tamaño."""
+        size = value.positions.nbytes if isinstance(value, CandidatePool) else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self._bytes > self.max_bytes and len(self._data) > 1):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+    
+    def clear(self):
+        """Invalida todas las entradas (al recargar el catálogo)."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+CANDIDATE_CACHE = CandidateCache()
+
+# Las entradas de un catálogo anterior ya no sirven: se liberan al recargar
+CATALOG_MANAGER.add_listener(lambda catalog: CANDIDATE_CACHE.clear())
+
+def __getattr__(name):
+    """Compatibilidad: PRODUCTS_DF, CATALOG_INDEX y PRODUCT_RECORDS del catálogo vigente."""
+    catalog = get_catalog()
+    if name == 'PRODUCTS_DF':
+        return catalog.df
+    if name == 'CATALOG_INDEX':
+        return catalog.index
+    if name == 'PRODUCT_RECORDS':
+        return catalog.records
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def set_catalog(df):
     """
-    Infiere la categoría del producto basándose en palabras clave en el título.
+    Instala un catálogo ya limpio: calcula sus campos de presentación y su
+    índice, y lo publica (la caché de candidatos se invalida sola).
     """
-    if not isinstance(title, str):
-        return "crema_hidratante"  # Default category
-    
-    title_lower = title.lower()
-    
-    # Mapeo de palabras clave a categorías - MEJORADO para tu CSV
-    category_keywords = {
-        "limpiador": ["cleanser", "face wash", "limpiador", "wash", "cleansing", "gel limpiador"],
-        "exfoliante": ["exfoliant", "scrub", "exfoliante", "peeling", "gommage", "AHA", "BHA", "ácido", "salicylic"],
-        "serum": ["serum", "serum", "esencia", "concentrate", "treatment", "booster", "vitamin c", "niacinamide", "hyaluronic"],
-        "crema_hidratante": ["moisturizer", "cream", "crema", "hidratante", "lotion", "emulsion", "balm", "nourishing", "hydrating"],
-        "protector_solar": ["sunscreen", "spf", "sun protection", "protector solar", "block", "shield", "sunblock"],
-        "mascarilla": ["mask", "mascarilla", "treatment mask", "sheet mask"]
-    }
-    
-    for category, keywords in category_keywords.items():
-        if any(keyword in title_lower for keyword in keywords):
-            return category
-    
-    return "crema_hidratante"  # Default si no se encuentra
+    return CATALOG_MANAGER.install(df)
 
-def extract_amazon_image(amazon_url):
+def normalize_concerns(user_concern: str) -> frozenset:
     """
-    Intenta extraer la imagen de un producto de Amazon de la URL.
-    Devuelve una URL de imagen o una imagen por defecto.
+    Convierte la cadena de condiciones (ej: "acne, manchas") en un conjunto
+    normalizado, ignorando mayúsculas, orden, vacíos y "Ninguna".
+    """
+    if not user_concern:
+        return frozenset()
+    concerns = {c.strip().lower() for c in user_concern.split(',')}
+    concerns.discard('')
+    concerns.discard('ninguna')
+    return frozenset(concerns)
+
+# Resultado cacheable de la cadena de filtros para una categoría:
+# posiciones candidatas + qué nivel de respaldo se usó y cuántos quedaron en cada etapa
+CandidatePool = namedtuple('CandidatePool', ['positions', 'tier', 'after_skin', 'concern', 'after_concern'])
+
+# Peso de cada señal en el puntaje de ranking:
+# nivel de coincidencia de piel (0-2), palabras clave de preocupación en el título
+# y precio (0-1, más alto cuanto más barato). La piel domina, el precio desempata.
+RANKING_WEIGHTS = {'skin': 4.0, 'concern': 1.0, 'price': 0.5}
+
+# Con semilla, se baraja entre los DIVERSITY_POOL_FACTOR * limit mejores
+DIVERSITY_POOL_FACTOR = 3
+
+class StageStats:
+    """
+    Contadores agregados en memoria del pipeline de recomendación:
+    qué nivel de respaldo se usó, si el filtro por preocupación aplicó
+    y cuántos candidatos quedaron tras cada etapa (suma para promediar).
     """
-    if not amazon_url or amazon_url == '#':
-        return "https://via.placeholder.com/200x200/667eea/ffffff?text=Sin+Imagen"
     
-    try:
-        # Para enlaces de Amazon, podemos intentar construir la URL de imagen
-        # Basado en el ASIN (Amazon Standard Identification Number)
-        
-        # Extraer ASIN del URL de Amazon (patrón común)
-        asin_pattern = r'/([A-Z0-9]{10})(?:[/?]|$)'
-        match = re.search(asin_pattern, amazon_url)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.lookups = 0
+            self.routine_fallbacks = 0
+            self.tiers = Counter()
+            self.concern = Counter()
+            self.candidate_sums = Counter()
+    
+    def record(self, pool: CandidatePool):
+        with self._lock:
+            self.lookups += 1
+            self.tiers[pool.tier] += 1
+            self.concern[pool.concern] += 1
+            self.candidate_sums['after_skin'] += pool.after_skin
+            self.candidate_sums['after_concern'] += pool.after_concern
+            self.candidate_sums['final'] += len(pool.positions)
+    
+    def record_routine_fallback(self):
+        with self._lock:
+            self.routine_fallbacks += 1
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.lookups or 1
+            return {
+                'lookups': self.lookups,
+                'routine_fallbacks': self.routine_fallbacks,
+                'tiers': dict(self.tiers),
+                'concern_filter': dict(self.concern),
+                'avg_candidates': {
+                    stage: round(total / lookups, 2) for stage, total in self.candidate_sums.items()
+                }
+            }
+
+STAGE_STATS = StageStats()
+
+def _profile_id_sets(catalog, user_skin_type_lower: str, concerns: frozenset):
+    """
+    Calcula, una sola vez por perfil, las filas compatibles con el tipo de piel
+    y las filas que coinciden con alguna preocupación (None si no hay ninguna conocida).
+    """
+    index = catalog.index
+    
+    # Tipos de piel objetivo (Español → Inglés)
+    target_skin_types = SKIN_TYPE_MAPPING.get(user_skin_type_lower, ['all'])
+    logger.debug("Buscando tipos de piel: %s", target_skin_types)
+    
+    skin_ids = index['none'].copy()
+    for skin_type in target_skin_types:
+        skin_ids |= index['skin_type'].get(skin_type, index['none'])
+    
+    # Productos que coinciden con al menos una de las preocupaciones conocidas:
+    # reducción por filas de las columnas del perfil en la matriz precalculada
+    concern_ids = None
+    columns = concern_columns(concerns)
+    if columns:
+        concern_ids = index['concern_hits'][:, columns].any(axis=1)
+    return skin_ids, concern_ids
+
+def _candidates_for_category(catalog, skin_ids, concern_ids, product_category: str = None) -> CandidatePool:
+    """
+    Aplica la cadena de filtros y respaldos (piel → relajar → categoría → todo)
+    sobre las máscaras precalculadas del perfil.
+    """
+    index = catalog.index
+    category_rows = index['category'].get(product_category, index['none'])
+    
+    # 1. CANDIDATOS INICIALES - todas las filas del índice
+    candidates = index['all']
+    
+    # 2. FILTRADO POR CATEGORÍA SI SE ESPECIFICA
+    if product_category and product_category != "otros":
+        candidates = category_rows
+    
+    # 3. FILTRADO POR TIPO DE PIEL
+    candidates = candidates & skin_ids
+    after_skin = int(np.count_nonzero(candidates))
+    tier = 'piel'
+    
+    # 4. SI NO HAY COINCIDENCIAS, RELAJAR FILTROS
+    if not after_skin:
+        tier = 'sin_filtro_piel'
+        candidates = category_rows if product_category else index['all']
+    
+    # 5. FILTRADO POR PREOCUPACIÓN (palabras clave en títulos)
+    concern = 'no_aplica'
+    if concern_ids is not None and candidates.any():
+        concern_filtered = candidates & concern_ids
         
-        if match:
-            asin = match.group(1)
-            # Construir URL de imagen usando el ASIN
-            image_url = f"https://images-na.ssl-images-amazon.com/images/P/{asin}.01._SCLZZZZZZZ_.jpg"
-            return image_url
+        if concern_filtered.any():
+            candidates = concern_filtered
+            concern = 'aplicado'
         else:
-            # Si no podemos extraer ASIN, usar imagen por categoría
-            return "https://via.placeholder.com/200x200/667eea/ffffff?text=Producto"
-            
-    except Exception as e:
-        print(f"⚠️ Error extrayendo imagen de Amazon: {e}")
+            concern = 'sin_coincidencias'
+    after_concern = int(np.count_nonzero(candidates))
+    
+    # 6. SI TODAVÍA NO HAY RESULTADOS, USAR TODOS LOS PRODUCTOS DE LA CATEGORÍA
+    if not after_concern and product_category:
+        tier = 'categoria'
+        candidates = category_rows
+    
+    # 7. SI TODAVÍA NO HAY NADA, USAR TODOS LOS PRODUCTOS
+    if not candidates.any():
+        tier = 'general'
+        candidates = index['all']
     
-    # Imagen por defecto
-    return "https://via.placeholder.com/200x200/667eea/ffffff?text=SkinFit"
+    logger.debug(
+        "Categoría %r: %d tras piel, %d tras preocupación (%s), respaldo %s",
+        product_category, after_skin, after_concern, concern, tier
+    )
+    positions = np.flatnonzero(candidates).astype(np.int32)  # La mitad de bytes en la caché
+    positions.flags.writeable = False
+    return CandidatePool(positions, tier, after_skin, concern, after_concern)
 
-PRODUCTS_DF = pd.DataFrame()  # Inicializamos vacío
+def _candidate_pools(catalog, user_skin_type_lower: str, concerns: frozenset, categories):
+    """
+    Devuelve {categoría: CandidatePool}, usando la caché LRU y calculando los
+    conjuntos del perfil solo si hay algún fallo.
+    """
+    profile_sets = None
+    pools = {}
+    for product_category in categories:
+        if product_category in pools:
+            continue
+        key = (catalog.version, user_skin_type_lower, concerns, product_category)
+        pool = CANDIDATE_CACHE.get(key)
+        if pool is None:
+            if profile_sets is None:
+                profile_sets = _profile_id_sets(catalog, user_skin_type_lower, concerns)
+            pool = _candidates_for_category(catalog, *profile_sets, product_category)
+            CANDIDATE_CACHE.put(key, pool)
+        STAGE_STATS.record(pool)
+        pools[product_category] = pool
+    return pools
 
-try:
-    # Intenta cargar el dataset
-    print(f"🔍 Cargando dataset desde: {DATA_PATH}")
-    df_temp = pd.read_csv(DATA_PATH)
-    
-    # Verificar que el archivo no esté vacío
-    if df_temp.empty:
-        raise ValueError("El archivo CSV está vacío")
+def profile_seed(user_skin_type: str, user_concern: str = "", salt: int = 0) -> int:
+    """
+    Semilla estable para la mezcla de diversidad: depende solo del tipo de piel
+    y de las preocupaciones normalizadas, así que perfiles iguales reciben
+    siempre los mismos productos (y el resultado se puede cachear).
+    """
+    concerns = ','.join(sorted(normalize_concerns(user_concern)))
+    return zlib.crc32(f"{(user_skin_type or '').lower()}|{concerns}|{salt}".encode('utf-8'))
+
+def _score_candidates(catalog, positions, user_skin_type_lower: str, concerns: frozenset):
+    """Puntaje de ranking de cada posición candidata (array de floats)."""
+    ranking = catalog.ranking
+    weights = RANKING_WEIGHTS
+    scores = ranking['price_score'][positions] * weights['price']
     
-    print(f"✅ CSV cargado: {len(df_temp)} productos encontrados")
+    skin_tier = ranking['skin_tier'].get(user_skin_type_lower)
+    if skin_tier is not None:
+        scores += skin_tier[positions] * weights['skin']
     
-    # LIMPIEZA ESPECÍFICA PARA TU CSV
-    # Tu CSV tiene: Title, Product, Category, Brand, Skin_Type, Price, Link
+    # Coincidencias sumadas de todas las preocupaciones del perfil
+    columns = concern_columns(concerns)
+    if columns:
+        hits = catalog.index['concern_hits'][np.ix_(positions, columns)].sum(axis=1)
+        scores += hits * weights['concern']
+    return scores
+
+def _top_k(positions, scores, k: int):
+    """
+    Las k posiciones de mayor puntaje, de mejor a peor, en O(n): partición
+    alrededor del k-ésimo puntaje y orden completo solo de los k elegidos.
+    Los empates se resuelven por orden del catálogo, así que es determinista.
+    """
+    if len(positions) > k:
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = scores > threshold
+        ties = np.flatnonzero(scores == threshold)[:k - int(above.sum())]
+        chosen = np.concatenate((np.flatnonzero(above), ties))
+        positions, scores = positions[chosen], scores[chosen]
+    order = np.lexsort((positions, -scores))
+    return positions[order]
+
+def _ranked_positions(catalog, pool: CandidatePool, user_skin_type_lower: str, concerns: frozenset,
+                      product_category: str, limit: int, seed: int = None):
+    """
+    Posiciones elegidas para el frontend, cacheadas por perfil + (límite, semilla).
+    Sin semilla son las `limit` de mayor puntaje; con semilla, una muestra
+    determinista de las DIVERSITY_POOL_FACTOR * limit mejores, en orden de puntaje.
+    """
+    key = (catalog.version, user_skin_type_lower, concerns, product_category, limit, seed)
+    ranked = CANDIDATE_CACHE.get(key)
+    if ranked is not None:
+        return ranked
     
-    # 1. Title - nombre del producto
-    if 'Title' in df_temp.columns:
-        df_temp['Title'] = df_temp['Title'].fillna('Producto sin nombre').astype(str).str.strip()
-        # Limpiar espacios extra y caracteres raros
-        df_temp['Title'] = df_temp['Title'].str.replace(r'\s+', ' ', regex=True)
+    positions = pool.positions
+    scores = _score_candidates(catalog, positions, user_skin_type_lower, concerns)
+    if seed is None:
+        ranked = _top_k(positions, scores, limit)
     else:
-        df_temp['Title'] = 'Producto sin nombre'
+        best = _top_k(positions, scores, limit * DIVERSITY_POOL_FACTOR)
+        picks = random.Random(seed).sample(range(len(best)), min(limit, len(best)))
+        ranked = best[sorted(picks)]
     
-    # 2. Brand - marca
-    if 'Brand' in df_temp.columns:
-        df_temp['Brand'] = df_temp['Brand'].fillna('Marca desconocida').astype(str).str.strip()
-    else:
-        df_temp['Brand'] = 'Marca desconocida'
-    
-    # 3. Skin_Type - tipo de piel (CRÍTICO para las recomendaciones)
-    if 'Skin_Type' in df_temp.columns:
-        df_temp['Skin_Type'] = df_temp['Skin_Type'].fillna('All').astype(str)
-        # Limpiar y estandarizar tipos de piel
-        df_temp['Skin_Type'] = df_temp['Skin_Type'].str.replace('"', '').str.strip()
-        # Convertir a minúsculas para consistencia
-        df_temp['Skin_Type'] = df_temp['Skin_Type'].str.lower()
-    else:
-        df_temp['Skin_Type'] = 'all'
-    
-    # 4. Price - precio
-    if 'Price' in df_temp.columns:
-        # Limpiar precios - convertir a numérico
-        df_temp['Price'] = df_temp['Price'].fillna(0)
-        try:
-            df_temp['Price'] = pd.to_numeric(df_temp['Price'], errors='coerce').fillna(0)
-        except:
-            df_temp['Price'] = 0
-    else:
-        df_temp['Price'] = 0
+    ranked = tuple(ranked.tolist())
+    CANDIDATE_CACHE.put(key, ranked)
+    return ranked
+
+def _select_and_serialize(catalog, pool: CandidatePool, limit: int, product_category: str = None,
+                          user_skin_type_lower: str = "", concerns: frozenset = frozenset(), seed: int = None):
+    """
+    Elige hasta `limit` filas del conjunto candidato por puntaje y las prepara para el frontend.
+    """
+    if not len(pool.positions):
+        logger.warning("No hay productos de categoría %r disponibles", product_category)
+        return []
     
-    # 5. Link - enlace
-    if 'Link' in df_temp.columns:
-        df_temp['Link'] = df_temp['Link'].fillna('#').astype(str)
-    else:
-        df_temp['Link'] = '#'
-    
-    # 6. Category - categoría del producto (usaremos la inferida)
-    print("📦 Inferiendo categorías de productos...")
-    df_temp['Category'] = df_temp['Title'].apply(infer_product_category)
-    
-    # Mostrar distribución de categorías
-    category_counts = df_temp['Category'].value_counts()
-    print("📊 Distribución de categorías inferidas:")
-    for category, count in category_counts.items():
-        print(f"   {category}: {count} productos")
-    
-    PRODUCTS_DF = df_temp
-    print(f"✅ Sistema de recomendación listo con {len(PRODUCTS_DF)} productos")
-    
-except FileNotFoundError:
-    print(f"❌ ERROR: Archivo no encontrado en: {DATA_PATH}")
-    print("   Verifica que 'skincare.csv' esté en la carpeta 'data'")
-except pd.errors.EmptyDataError:
-    print("❌ ERROR: El archivo CSV está vacío")
-except Exception as e:
-    print(f"❌ ERROR inesperado al cargar el CSV: {e}")
-    import traceback
-    traceback.print_exc()
+    positions = _ranked_positions(catalog, pool, user_skin_type_lower, concerns, product_category, limit, seed)
+    
+    # Datos para el frontend: cada registro es un diccionario nuevo armado
+    # desde las columnas de solo lectura del catálogo
+    records = catalog.records
+    return [records[position] for position in positions]
 
-def recommend_products_by_category(user_skin_type: str, user_concern: str = "", product_category: str = None, limit: int = 3):
+def recommend_products_by_category(user_skin_type: str, user_concern: str = "", product_category: str = None, limit: int = 3,
+                                   seed: int = None):
     """
-    Recomienda productos específicos por categoría.
+    Recomienda productos específicos por categoría, de mayor a menor puntaje.
+    Con `seed` (ver profile_seed) baraja entre los mejores para dar variedad.
     """
-    if PRODUCTS_DF.empty:
-        print("⚠️  No hay datos de productos disponibles")
+    catalog = get_catalog()  # Mismo catálogo durante toda la petición
+    if catalog.df.empty:
+        logger.warning("No hay datos de productos disponibles")
         return []
     
     # Validar parámetros
     if not user_skin_type:
-        print("⚠️  No se proporcionó tipo de piel")
+        logger.warning("No se proporcionó tipo de piel")
         return []
     
     user_skin_type_lower = user_skin_type.lower()
-    user_concern_lower = user_concern.lower() if user_concern else ""
+    concerns = normalize_concerns(user_concern)
     
-    print(f"🎯 Generando recomendaciones para: piel '{user_skin_type}', categoría: '{product_category}'")
+    logger.debug("Generando recomendaciones para: piel %r, categoría %r", user_skin_type, product_category)
     
     try:
-        # 1. MAPEO DE TIPOS DE PIEL (Español → Inglés)
-        skin_type_mapping = {
-            'seca': ['dry', 'very dry', 'all'],
-            'mixta': ['combination', 'normal', 'all'],
-            'grasa': ['oily', 'acne', 'acne prone', 'all'],
-            'sensible': ['sensitive', 'all'],
-            'normal': ['normal', 'all']
-        }
-        
-        # Obtener los tipos de piel objetivo para buscar
-        target_skin_types = skin_type_mapping.get(user_skin_type_lower, ['all'])
-        print(f"   🔍 Buscando tipos de piel: {target_skin_types}")
-        
-        # 2. FILTRADO INICIAL - empezar con todos los productos
-        filtered_df = PRODUCTS_DF.copy()
-        
-        # 3. FILTRADO POR CATEGORÍA SI SE ESPECIFICA
-        if product_category and product_category != "otros":
-            category_mask = filtered_df['Category'] == product_category
-            filtered_df = filtered_df[category_mask]
-            print(f"   📦 Filtrado por categoría '{product_category}': {len(filtered_df)} productos")
-        
-        # 4. FILTRADO POR TIPO DE PIEL (búsqueda flexible)
-        skin_filtered_dfs = []
-        for skin_type in target_skin_types:
-            # Buscar en la columna Skin_Type
-            mask = filtered_df['Skin_Type'].str.contains(skin_type, case=False, na=False)
-            matching_products = filtered_df[mask]
-            skin_filtered_dfs.append(matching_products)
-        
-        if skin_filtered_dfs:
-            filtered_df = pd.concat(skin_filtered_dfs).drop_duplicates()
-        else:
-            filtered_df = pd.DataFrame()
-        
-        print(f"   📊 Productos después de filtro por piel: {len(filtered_df)}")
-        
-        # 5. SI NO HAY COINCIDENCIAS, RELAJAR FILTROS
-        if filtered_df.empty:
-            print("   🔄 No hay coincidencias exactas, usando productos de la categoría sin filtro de piel")
-            if product_category:
-                filtered_df = PRODUCTS_DF[PRODUCTS_DF['Category'] == product_category]
-            else:
-                filtered_df = PRODUCTS_DF.copy()
-        
-        # 6. FILTRADO POR PREOCUPACIÓN (búsqueda en títulos)
-        if user_concern_lower and not filtered_df.empty:
-            concern_keywords = {
-                'acne': ['acne', 'pimple', 'oil-free', 'salicylic', 'tea tree', 'breakout', 'blemish', 'acne prone'],
-                'manchas': ['bright', 'glow', 'vitamin c', 'pigmentation', 'radiance', 'lightening', 'dark spot', 'brightening'],
-                'arrugas': ['anti-aging', 'wrinkle', 'firming', 'retinol', 'peptide', 'anti age', 'anti-wrinkle', 'firming'],
-                'seca': ['hydrating', 'moisturizing', 'dry skin', 'hydration', 'moisture', 'nourishing', 'dry'],
-                'sensible': ['sensitive', 'calming', 'gentle', 'soothing', 'fragrance-free', 'hypoallergenic']
-            }
-            
-            keywords = concern_keywords.get(user_concern_lower, [])
-            if keywords:
-                concern_mask = filtered_df['Title'].str.contains(
-                    '|'.join(keywords), case=False, na=False
-                )
-                concern_filtered = filtered_df[concern_mask]
-                
-                if not concern_filtered.empty:
-                    filtered_df = concern_filtered
-                    print(f"   🔍 Productos después de filtro por '{user_concern}': {len(filtered_df)}")
-        
-        # 7. SI TODAVÍA NO HAY RESULTADOS, USAR TODOS LOS PRODUCTOS DE LA CATEGORÍA
-        if filtered_df.empty and product_category:
-            print("   🔄 No hay productos que coincidan, mostrando cualquier producto de la categoría")
-            filtered_df = PRODUCTS_DF[PRODUCTS_DF['Category'] == product_category]
-        
-        # 8. SI TODAVÍA NO HAY NADA, USAR TODOS LOS PRODUCTOS
-        if filtered_df.empty:
-            print("   🔄 No hay productos en la categoría, mostrando productos generales")
-            filtered_df = PRODUCTS_DF.copy()
-        
-        # 9. SELECCIÓN FINAL
-        if filtered_df.empty:
-            print(f"   ❌ No hay productos de categoría '{product_category}' disponibles")
-            return []
+        pools = _candidate_pools(catalog, user_skin_type_lower, concerns, [product_category])
+        return _select_and_serialize(
+            catalog, pools[product_category], limit, product_category, user_skin_type_lower, concerns, seed
+        )
         
-        # Seleccionar aleatoriamente hasta el límite
-        if len(filtered_df) > limit:
-            recommended = filtered_df.sample(n=limit)
-        else:
-            recommended = filtered_df
-        
-        print(f"   ✅ {len(recommended)} productos recomendados para categoría '{product_category}'")
-        
-        # 10. PREPARAR DATOS PARA EL FRONTEND
-        results = []
-        for _, product in recommended.iterrows():
-            # Formatear precio - CONVERSIÓN A USD Y COP
-            price_inr = product.get('Price', 0)
-            
-            if price_inr == 0 or pd.isna(price_inr):
-                price_display = "Consultar precio"
-                price_usd = "Consultar precio"
-                price_cop = "Consultar precio"
-            else:
-                try:
-                    price_inr_float = float(price_inr)
-                    # Conversiones aproximadas (puedes ajustar las tasas)
-                    # 1 INR = 0.012 USD (aproximado)
-                    # 1 USD = 4000 COP (aproximado)
-                    price_usd = price_inr_float * 0.012
-                    price_cop = price_usd * 4000
-                    
-                    price_display = f"${price_usd:.2f} USD"
-                    price_usd = f"${price_usd:.2f}"
-                    price_cop = f"${price_cop:,.0f} COP"
-                    
-                except:
-                    price_display = f"₹{price_inr}"
-                    price_usd = "Consultar precio"
-                    price_cop = "Consultar precio"
-            
-            # Acortar título si es muy largo
-            product_name = product.get('Title', 'Producto sin nombre')
-            if len(product_name) > 80:
-                product_name = product_name[:77] + "..."
-            
-            product_dict = {
-                'product_name': product_name,
-                'brand': product.get('Brand', 'Marca desconocida'),
-                'link': product.get('Link', '#'),
-                'price_display': price_display,  # Precio principal para mostrar
-                'price_usd': price_usd,          # Precio en USD
-                'price_cop': price_cop,          # Precio en COP
-                'price_inr': f"₹{price_inr}",    # Precio original en INR
-                'category': product.get('Category', 'crema_hidratante'),
-                'image_url': extract_amazon_image(product.get('Link', '#'))  # URL de imagen
-            }
-            results.append(product_dict)
-        
-        return results
-        
-    except Exception as e:
-        print(f"❌ ERROR durante la recomendación por categoría: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error durante la recomendación por categoría")
         return []
 
-def recommend_products(user_skin_type: str, user_concern: str = "", limit: int = 6):
+def recommend_products_for_categories(user_skin_type: str, user_concern: str = "", categories=(), limit: int = 2,
+                                      seed: int = None):
+    """
+    Versión por lotes de recommend_products_by_category: calcula una sola vez
+    los candidatos de piel/preocupación del perfil y los reparte por categoría.
+    Devuelve un dict {categoría: [productos]}.
+    """
+    catalog = get_catalog()  # Mismo catálogo durante toda la petición
+    if catalog.df.empty:
+        logger.warning("No hay datos de productos disponibles")
+        return {}
+    
+    if not user_skin_type:
+        logger.warning("No se proporcionó tipo de piel")
+        return {}
+    
+    user_skin_type_lower = user_skin_type.lower()
+    concerns = normalize_concerns(user_concern)
+    
+    logger.debug("Generando recomendaciones para: piel %r, categorías %s", user_skin_type, categories)
+    
+    try:
+        pools = _candidate_pools(catalog, user_skin_type_lower, concerns, categories)
+        return {
+            product_category: _select_and_serialize(
+                catalog, pool, limit, product_category, user_skin_type_lower, concerns, seed
+            )
+            for product_category, pool in pools.items()
+        }
+        
+    except Exception:
+        logger.exception("Error durante la recomendación por lotes")
+        return {}
+
+def recommend_products(user_skin_type: str, user_concern: str = "", limit: int = 6, seed: int = None):
     """
     FUNCIÓN ORIGINAL MANTENIDA PARA COMPATIBILIDAD
     """
-    return recommend_products_by_category(user_skin_type, user_concern, None, limit)
+    return recommend_products_by_category(user_skin_type, user_concern, None, limit, seed)
 
-def recommend_products_for_routine(rutina_personalizada, user_skin_type: str, user_concern: str = ""):
+def recommend_products_for_routine(rutina_personalizada, user_skin_type: str, user_concern: str = "", seed: int = None):
     """
     Recomienda productos específicos para cada paso de la rutina.
+    Los candidatos del perfil se calculan una sola vez para todos los pasos.
     """
     all_recommended_products = []
     
-    print(f"🔄 Buscando productos para rutina con {len(rutina_personalizada.pasos)} pasos...")
+    logger.debug("Buscando productos para rutina con %d pasos", len(rutina_personalizada.pasos))
+    
+    # Una sola pasada para todas las categorías de la rutina
+    categorias = [paso.get('tipo_producto') for paso in rutina_personalizada.pasos if paso.get('tipo_producto')]
+    productos_por_categoria = recommend_products_for_categories(
+        user_skin_type,
+        user_concern,
+        categorias,
+        limit=2,  # 2 productos por categoría
+        seed=seed
+    )
     
-    # Para cada paso en la rutina, buscar productos de esa categoría
+    # Repartir los productos en cada paso de la rutina
     for paso in rutina_personalizada.pasos:
         tipo_producto = paso.get('tipo_producto')
         
         if tipo_producto:
-            print(f"   🔍 Buscando productos para paso: {paso['nombre']} (categoría: {tipo_producto})")
-            
-            productos_paso = recommend_products_by_category(
-                user_skin_type, 
-                user_concern, 
-                tipo_producto, 
-                limit=2  # 2 productos por categoría
-            )
+            # Copias para no compartir diccionarios entre pasos de la misma categoría
+            productos_paso = [dict(p) for p in productos_por_categoria.get(tipo_producto, [])]
             
             # Agregar información del paso a los productos
             for producto in productos_paso:
@@ -341,12 +464,21 @@ def recommend_products_for_routine(rutina_personalizada, user_skin_type: str, us
                 producto['orden_paso'] = paso['orden']
             
             all_recommended_products.extend(productos_paso)
-            print(f"   ✅ Encontrados {len(productos_paso)} productos para {paso['nombre']}")
+            logger.debug("Encontrados %d productos para %s", len(productos_paso), paso['nombre'])
     
     # Si no encontramos productos por categoría, usar recomendación general
     if not all_recommended_products:
-        print("   🔄 No se encontraron productos por categoría, usando recomendación general")
-        all_recommended_products = recommend_products(user_skin_type, user_concern, limit=6)
+        STAGE_STATS.record_routine_fallback()
+        logger.info("No se encontraron productos por categoría, usando recomendación general")
+        all_recommended_products = recommend_products(user_skin_type, user_concern, limit=6, seed=seed)
     
-    print(f"🎉 Total de productos recomendados: {len(all_recommended_products)}")
-    return all_recommended_products
\ No newline at end of file
+    logger.debug("Total de productos recomendados: %d", len(all_recommended_products))
+    return all_recommended_products
+
+def get_cache_stats() -> dict:
+    """Estadísticas de la caché de candidatos (tamaño, aciertos y fallos)."""
+    return CANDIDATE_CACHE.stats()
+
+def get_stage_stats() -> dict:
+    """Contadores agregados por etapa del pipeline de recomendación."""
+    return STAGE_STATS.snapshot()
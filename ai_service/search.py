@@ -0,0 +1,143 @@
+# ai_service/search.py
+# Búsqueda de productos por texto sobre un índice invertido de tokens.
+#
+# El índice se arma una vez por versión del catálogo con los tokens de
+# Title y Brand (minúsculas, \w+). Se guarda como arrays de numpy:
+#   - vocabulary: tokens distintos ordenados alfabéticamente
+#   - offsets / postings: para el token i, las filas del catálogo que lo
+#     contienen son postings[offsets[i]:offsets[i + 1]] (ordenadas)
+# Como el vocabulario está ordenado, todos los tokens que empiezan con un
+# prefijo son un rango contiguo (dos searchsorted) y sus filas son un único
+# tramo de postings: una búsqueda por prefijo no recorre el catálogo.
+
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ai_service.catalog import CATALOG_MANAGER, SKIN_TYPE_MAPPING, get_catalog, read_only
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Mayor que cualquier carácter: prefijo + MAX_CHAR acota el rango del prefijo
+_MAX_CHAR = '\U0010ffff'
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+SearchIndex = namedtuple('SearchIndex', ['version', 'vocabulary', 'offsets', 'postings'])
+
+SearchResults = namedtuple('SearchResults', ['total', 'page', 'per_page', 'results'])
+
+
+def tokenize(text: str) -> list:
+    """Tokens de búsqueda de un texto (minúsculas, letras y dígitos)."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_search_index(df, version=None) -> SearchIndex:
+    """Índice invertido token → filas de un catálogo limpio."""
+    rows = len(df)
+    if df.empty:
+        empty = read_only(np.zeros(0, dtype=np.int32))
+        return SearchIndex(version, read_only(np.array([], dtype=str)), read_only(np.zeros(1, dtype=np.int64)), empty)
+
+    brands = df['Brand'].astype(object).fillna('').astype(str)
+    texts = (df['Title'].fillna('').astype(str) + ' ' + brands).str.lower()
+    row_tokens = [set(TOKEN_RE.findall(text)) for text in texts.tolist()]
+    counts = np.fromiter(map(len, row_tokens), dtype=np.int64, count=rows)
+    rows_of_token = np.repeat(np.arange(rows, dtype=np.int32), counts)
+
+    # Códigos de token en orden alfabético del vocabulario
+    codes, uniques = pd.factorize(np.array([t for tokens in row_tokens for t in tokens], dtype=object))
+    order = np.argsort(uniques.astype(str))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    codes = rank[codes]
+
+    by_token = np.lexsort((rows_of_token, codes))
+    offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(uniques)), out=offsets[1:])
+    return SearchIndex(
+        version,
+        read_only(np.array(uniques[order].tolist(), dtype=str)),
+        read_only(offsets),
+        read_only(rows_of_token[by_token]),
+    )
+
+
+def _token_rows(search_index: SearchIndex, token: str, prefix: bool, rows: int):
+    """Máscara de filas con el token exacto o con algún token que empieza por él."""
+    vocabulary = search_index.vocabulary
+    lo = np.searchsorted(vocabulary, token, side='left')
+    if prefix:
+        hi = np.searchsorted(vocabulary, token + _MAX_CHAR, side='left')
+    else:
+        hi = lo + 1 if lo < len(vocabulary) and vocabulary[lo] == token else lo
+    mask = np.zeros(rows, dtype=bool)
+    mask[search_index.postings[search_index.offsets[lo]:search_index.offsets[hi]]] = True
+    return mask
+
+
+def _filter_rows(catalog, category: str = None, skin_type: str = None, brand: str = None):
+    """Máscara de los filtros por categoría, tipo de piel y marca (None si no hay filtros)."""
+    index = catalog.index
+    mask = None
+
+    if category:
+        mask = index['category'].get(category.strip().lower(), index['none'])
+
+    if skin_type:
+        # Acepta el tipo del formulario (grasa, seca...) o el término del CSV (oily, dry...)
+        skin_type = skin_type.strip().lower()
+        skin_rows = index['none']
+        for term in SKIN_TYPE_MAPPING.get(skin_type, [skin_type]):
+            skin_rows = skin_rows | index['skin_type'].get(term, index['none'])
+        mask = skin_rows if mask is None else mask & skin_rows
+
+    if brand:
+        brands = catalog.df['Brand'].cat
+        matching = np.flatnonzero(brands.categories.astype(str).str.lower() == brand.strip().lower())
+        brand_rows = np.isin(brands.codes.to_numpy(), matching)
+        mask = brand_rows if mask is None else mask & brand_rows
+
+    return mask
+
+
+def search_products(query: str = "", category: str = None, skin_type: str = None, brand: str = None,
+                    page: int = 1, per_page: int = DEFAULT_PER_PAGE, catalog=None) -> SearchResults:
+    """
+    Productos cuyos títulos o marcas contienen todos los tokens de `query`.
+    El último token (o cualquiera que termine en '*') se busca como prefijo,
+    así "vitamin c ser" encuentra "Vitamin C Serum". Los resultados siguen el
+    orden del catálogo y se paginan (page empieza en 1); su 'asin' es el que
+    usa /api/products/<asin>/similar.
+    """
+    if catalog is None:
+        catalog = get_catalog()
+    page = max(1, int(page))
+    per_page = min(max(1, int(per_page)), MAX_PER_PAGE)
+    rows = len(catalog)
+
+    mask = _filter_rows(catalog, category, skin_type, brand)
+    terms = [term for term in (query or '').lower().split() if term.strip('*')]
+    if terms:
+        search_index = get_search_index(catalog)
+        for i, term in enumerate(terms):
+            prefix = term.endswith('*') or i == len(terms) - 1
+            for token in tokenize(term):
+                token_rows = _token_rows(search_index, token, prefix, rows)
+                mask = token_rows if mask is None else mask & token_rows
+
+    positions = np.flatnonzero(mask) if mask is not None else np.arange(rows)
+    start = (page - 1) * per_page
+    records = catalog.records
+    return SearchResults(
+        len(positions), page, per_page,
+        [records[position] for position in positions[start:start + per_page].tolist()]
+    )
+
+
+# Índice de búsqueda por versión del catálogo: get_search_index(catalog=None)
+get_search_index = CATALOG_MANAGER.cached(lambda catalog: build_search_index(catalog.df, catalog.version))
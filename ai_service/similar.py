@@ -0,0 +1,145 @@
+# ai_service/similar.py
+# Productos similares: vecinos más cercanos precalculados por producto.
+#
+# Cada producto es un vector TF-IDF disperso de los tokens de su Title y
+# Brand (binario por token, idf calculado dentro de su Category,
+# normalizado). Las columnas salen del índice invertido de ai_service.search
+# (token → filas) partido por categoría, así que no se vuelve a tokenizar.
+#
+# La similitud coseno de todos contra todos (X · Xᵀ) se calcula por bloques
+# de filas: para cada fila del bloque se expanden sus tokens a las filas que
+# los comparten en su categoría, se suman los productos por pareja y se
+# quedan los SIMILAR_K mejores. Los tokens presentes en más de MAX_TOKEN_ROWS
+# filas (o en más de MAX_TOKEN_SHARE de la categoría) se tratan
+# como palabras vacías: aportan poco al coseno y son los que harían crecer
+# el trabajo con el cuadrado del catálogo.
+#
+# El resultado es una matriz int32 (productos × SIMILAR_K) con -1 de relleno:
+# servir los similares de un producto es leer una fila.
+
+from collections import namedtuple
+
+import numpy as np
+
+from ai_service.catalog import CATALOG_MANAGER, get_catalog, read_only
+from ai_service.search import get_search_index
+
+SIMILAR_K = 8
+
+# Palabras vacías: tokens en más filas que esto no cuentan para la similitud
+MAX_TOKEN_ROWS = 200
+MAX_TOKEN_SHARE = 0.5
+
+# Parejas (fila, fila con un token en común) por bloque: acota la memoria temporal
+BLOCK_PAIRS = 4_000_000
+
+SimilarIndex = namedtuple('SimilarIndex', ['version', 'neighbors'])
+
+
+def _expand(starts, lengths):
+    """Índices starts[i] .. starts[i] + lengths[i] - 1 de cada i, concatenados."""
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    return np.arange(total, dtype=np.int64) - np.repeat(ends - lengths - starts, lengths)
+
+
+def build_similar_index(catalog, k: int = SIMILAR_K) -> SimilarIndex:
+    """Los k vecinos más cercanos (coseno TF-IDF) de cada producto dentro de su categoría."""
+    rows = len(catalog)
+    neighbors = np.full((rows, k), -1, dtype=np.int32)
+    if not rows:
+        return SimilarIndex(catalog.version, read_only(neighbors))
+
+    search_index = get_search_index(catalog)
+    token_rows = np.diff(search_index.offsets)
+    category = catalog.df['Category'].cat.codes.to_numpy()
+    category_size = np.bincount(category[category >= 0], minlength=category.max() + 1)
+
+    # Columnas por (categoría, token): el índice invertido partido por categoría,
+    # así las filas que comparten un token ya son de la misma categoría
+    entry_row = search_index.postings
+    entry_token = np.repeat(np.arange(len(token_rows), dtype=np.int32), token_rows)
+    entry_category = category[entry_row]
+    order = np.lexsort((entry_row, entry_token, entry_category))
+    entry_row, entry_token, entry_category = entry_row[order], entry_token[order], entry_category[order]
+    new_group = np.ones(len(entry_row), dtype=bool)
+    new_group[1:] = (entry_token[1:] != entry_token[:-1]) | (entry_category[1:] != entry_category[:-1])
+    group_start = np.flatnonzero(new_group)
+    group_rows = np.diff(np.append(group_start, len(entry_row)))
+    entry_group = np.cumsum(new_group) - 1
+
+    # TF-IDF dentro de la categoría; palabras vacías con peso 0
+    size = category_size[entry_category[group_start]]
+    cap = np.minimum(MAX_TOKEN_ROWS, np.maximum(2, (MAX_TOKEN_SHARE * size).astype(np.int64)))
+    idf = np.log((1 + size) / (1 + group_rows)) + 1
+    weight = np.where(group_rows <= cap, idf * idf, 0).astype(np.float32)
+    useful = (group_rows >= 2) & (group_rows <= cap)
+    norms = np.sqrt(np.bincount(entry_row, weights=weight[entry_group], minlength=rows)).astype(np.float32)
+    norms[norms == 0] = 1
+
+    # Vista por filas de las entradas que generan parejas
+    postings = entry_row
+    keep = useful[entry_group]
+    by_row = np.argsort(entry_row[keep], kind='stable')
+    block_row, block_group = entry_row[keep][by_row], entry_group[keep][by_row]
+    row_start = np.searchsorted(block_row, np.arange(rows + 1))
+
+    # Bloques de filas con a lo sumo BLOCK_PAIRS parejas cada uno
+    pairs_per_row = np.bincount(block_row, weights=group_rows[block_group], minlength=rows)
+    pairs_before = np.concatenate(([0], np.cumsum(pairs_per_row)))
+
+    first = 0
+    while first < rows:
+        last = int(np.searchsorted(pairs_before, pairs_before[first] + BLOCK_PAIRS, side='right')) - 1
+        last = min(rows, max(last, first + 1))
+        entries = slice(row_start[first], row_start[last])
+        groups = block_group[entries]
+
+        # Producto del bloque por Xᵀ: cada (fila, token) contra las filas de su columna
+        lengths = group_rows[groups]
+        partner = postings[_expand(group_start[groups], lengths)]
+        row = np.repeat(block_row[entries], lengths)
+        distinct = partner != row
+        keys = (row[distinct] - first).astype(np.int64) * rows + partner[distinct]
+        if len(keys):
+            # Suma por pareja (fila, vecino): las claves ordenadas quedan agrupadas
+            order = np.argsort(keys)
+            keys = keys[order]
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            pair_weight = np.repeat(weight[groups], lengths)[distinct][order]
+            keys = keys[starts]
+            row = keys // rows + first
+            partner = keys % rows
+            score = np.add.reduceat(pair_weight, starts, dtype=np.float64) / (norms[row] * norms[partner])
+
+            # k mejores por fila: orden estable por (fila, -puntaje); dentro de
+            # cada fila los vecinos ya están por posición, así los empates
+            # se resuelven por orden del catálogo
+            order = np.argsort(row * 2.0 - score, kind='stable')
+            row, partner = row[order], partner[order]
+            rank = np.arange(len(row)) - np.searchsorted(row, row, side='left')
+            top = rank < k
+            neighbors[row[top], rank[top]] = partner[top]
+        first = last
+
+    return SimilarIndex(catalog.version, read_only(neighbors))
+
+
+def similar_products(position: int, limit: int = SIMILAR_K, catalog=None) -> list:
+    """
+    Registros de los productos más parecidos al de la posición dada (ver
+    Catalog.position_of), de más a menos parecido.
+    """
+    if catalog is None:
+        catalog = get_catalog()
+    if not 0 <= position < len(catalog):
+        raise IndexError(position)
+    row = get_similar_index(catalog).neighbors[position, :limit]
+    records = catalog.records
+    return [records[neighbor] for neighbor in row[row >= 0].tolist()]
+
+
+# Vecinos por versión del catálogo (se registra después del índice de búsqueda, que usa)
+get_similar_index = CATALOG_MANAGER.cached(build_similar_index)
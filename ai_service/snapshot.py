@@ -0,0 +1,154 @@
+# ai_service/snapshot.py
+# Instantánea binaria del catálogo ya limpio y categorizado.
+#
+# Formato: un archivo .npz comprimido (sin pickle) junto al CSV,
+# con una o varias arrays por columna:
+# - Columnas numéricas: se guardan tal cual.
+# - Columnas categóricas: códigos por fila + sus categorías como texto.
+# - Columnas de texto: todo el texto unido en UTF-8 + offsets por fila
+#   + máscara de nulos.
+# La instantánea guarda el SHA-256 del CSV de origen; si el CSV cambia,
+# se descarta y se reconstruye.
+
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Subir este número si cambia la limpieza del catálogo o el formato
+SNAPSHOT_VERSION = 4
+
+
+def snapshot_path(csv_path: str) -> str:
+    """Ruta de la instantánea asociada a un CSV (ej: data/skincare.catalog.npz)."""
+    base, _ = os.path.splitext(csv_path)
+    return base + '.catalog.npz'
+
+
+def source_key(csv_path) -> str:
+    """
+    Clave del CSV de origen: versión del formato + hash del contenido.
+    Con varios CSV (lista de rutas), el hash combina los de cada uno en orden.
+    """
+    if not isinstance(csv_path, str):
+        paths = list(csv_path)
+        if len(paths) == 1:
+            return source_key(paths[0])
+        combined = hashlib.sha256('\n'.join(source_key(path) for path in paths).encode('utf-8'))
+        return f"v{SNAPSHOT_VERSION}:{combined.hexdigest()}"
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return f"v{SNAPSHOT_VERSION}:{digest.hexdigest()}"
+
+
+def _encode_text(series):
+    """
+    Une una columna de texto en un buffer UTF-8 con offsets por carácter
+    y una máscara de valores nulos.
+    """
+    nulls = series.isna().to_numpy()
+    values = ['' if null else str(v) for v, null in zip(series.tolist(), nulls)]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    data = np.frombuffer(''.join(values).encode('utf-8'), dtype=np.uint8)
+    return data, offsets, nulls
+
+
+def _decode_text(data, offsets, nulls):
+    text = data.tobytes().decode('utf-8')
+    bounds = offsets.tolist()
+    values = [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    if nulls.any():
+        for position in nulls.nonzero()[0].tolist():
+            values[position] = None
+    return values
+
+
+def save_snapshot(csv_path: str, df, key: str = None) -> bool:
+    """
+    Guarda el catálogo limpio junto al CSV. La escritura es atómica
+    (archivo temporal + rename) para que otros procesos nunca lean
+    una instantánea a medio escribir. Devuelve False si no se pudo guardar.
+    """
+    path = snapshot_path(csv_path)
+    try:
+        key = key or source_key(csv_path)
+        arrays = {}
+        columns = []
+        for i, column in enumerate(df.columns):
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                arrays[f'c{i}_codes'] = series.cat.codes.to_numpy()
+                data, offsets, nulls = _encode_text(pd.Series(series.cat.categories, dtype=object))
+                arrays[f'c{i}_data'] = data
+                arrays[f'c{i}_offsets'] = offsets
+                arrays[f'c{i}_nulls'] = nulls
+                columns.append({'name': column, 'kind': 'cat'})
+            elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                arrays[f'c{i}'] = series.to_numpy()
+                columns.append({'name': column, 'kind': 'num'})
+            else:
+                data, offsets, nulls = _encode_text(series)
+                arrays[f'c{i}_data'] = data
+                arrays[f'c{i}_offsets'] = offsets
+                arrays[f'c{i}_nulls'] = nulls
+                columns.append({'name': column, 'kind': 'text'})
+
+        meta = {'key': key, 'rows': len(df), 'columns': columns}
+        arrays['meta'] = np.array(json.dumps(meta))
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        print(f"⚠️  No se pudo guardar la instantánea del catálogo: {e}")
+        return False
+
+
+def load_snapshot(csv_path: str, key: str = None):
+    """
+    Carga el catálogo limpio desde la instantánea si existe y corresponde
+    al CSV actual. Devuelve None si hay que reconstruirlo.
+    """
+    path = snapshot_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        key = key or source_key(csv_path)
+    except OSError as e:
+        print(f"⚠️  No se pudo revisar el CSV del catálogo: {e}")
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            if meta.get('key') != key:
+                return None
+
+            data = {}
+            for i, column in enumerate(meta['columns']):
+                if column['kind'] == 'num':
+                    data[column['name']] = npz[f'c{i}']
+                elif column['kind'] == 'cat':
+                    categories = _decode_text(npz[f'c{i}_data'], npz[f'c{i}_offsets'], npz[f'c{i}_nulls'])
+                    data[column['name']] = pd.Categorical.from_codes(npz[f'c{i}_codes'], categories)
+                else:
+                    data[column['name']] = _decode_text(
+                        npz[f'c{i}_data'], npz[f'c{i}_offsets'], npz[f'c{i}_nulls']
+                    )
+        return pd.DataFrame(data)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        # Archivo truncado o corrupto (disco lleno, copia a medias): se borra
+        # para no volver a leerlo en cada arranque
+        print(f"⚠️  Instantánea del catálogo inválida, se reconstruirá: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
@@ -1,155 +1,243 @@
 # app.py (VERSIÓN FINAL CON RUTINA UNIFICADA)
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, g
 import sqlite3
+import hmac
 import json 
+import logging
+import os
+import time
+from functools import lru_cache, wraps
+from itertools import combinations
+from types import MappingProxyType
 
 # Importaciones de módulos locales
-from database import get_db_connection, crear_o_actualizar_tabla_perfiles 
+from database import PROFILE_WRITER, crear_o_actualizar_tabla_perfiles, insertar_perfil
 from models import PerfilUsuario, RutinaPersonalizada
-from ai_service.recommender import recommend_products_for_routine, recommend_products
+from ai_service.recommender import (
+    recommend_products_for_routine, recommend_products, profile_seed, get_cache_stats, get_stage_stats
+)
+from ai_service.catalog import CATALOG_MANAGER
+from ai_service.search import search_products
+from ai_service.similar import SIMILAR_K, similar_products
+from metrics import (
+    REGISTRY, span, start_request_timing, finish_request_timing, server_timing_header,
+    process_memory_bytes, process_private_memory_bytes
+)
+
+# Nivel de log configurable (DEBUG muestra el detalle de cada recomendación)
+logging.basicConfig(
+    level=os.environ.get('SKINFIT_LOG_LEVEL', 'WARNING').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev_secret_key_skinfit_12345'
+# Cada cuántos segundos se revisa si cambió data/skincare.csv (0 = no recargar)
+app.config['CATALOG_POLL_SECONDS'] = float(os.environ.get('SKINFIT_CATALOG_POLL_SECONDS', 30))
+
+# Guardar perfiles en segundo plano (cola + escritura por lotes) en vez de en la petición
+app.config['ASYNC_PROFILE_WRITES'] = os.environ.get('SKINFIT_ASYNC_PROFILE_WRITES', '0') == '1'
+
+# Máximo de perfiles por petición a /api/recommend/batch
+app.config['MAX_BATCH_PROFILES'] = int(os.environ.get('SKINFIT_MAX_BATCH_PROFILES', 10000))
+
+# Variar los productos entre perfiles distintos con igual puntaje (mezcla con
+# semilla por perfil); desactivado, siempre se muestran los de mayor puntaje
+app.config['DIVERSITY_SHUFFLE'] = os.environ.get('SKINFIT_DIVERSITY_SHUFFLE', '0') == '1'
+
+# Token para las rutas /admin (cabecera 'Authorization: Bearer <token>'). Sin
+# token configurado solo se aceptan peticiones desde la propia máquina
+app.config['ADMIN_TOKEN'] = os.environ.get('SKINFIT_ADMIN_TOKEN', '')
+
+# Cabecera Server-Timing con los tiempos por etapa, solo para las peticiones
+# que la pidan con 'X-SkinFit-Timing: 1' (útil para depurar, apagada por defecto)
+app.config['TIMING_HEADER'] = os.environ.get('SKINFIT_TIMING_HEADER', '0') == '1'
+
+def iniciar_servicios_de_fondo(revisar_catalogo: bool = True):
+    """Hilos de fondo del proceso: revisión del catálogo y escritor de perfiles."""
+    if revisar_catalogo and app.config['CATALOG_POLL_SECONDS'] > 0:
+        CATALOG_MANAGER.start_polling(app.config['CATALOG_POLL_SECONDS'])
+    if app.config['ASYNC_PROFILE_WRITES']:
+        PROFILE_WRITER.start()
+
+# Con serve.py (varios procesos) los hilos no sobreviven al fork: cada worker
+# inicia los suyos y solo el proceso padre revisa el catálogo
+if os.environ.get('SKINFIT_PREFORK') != '1':
+    iniciar_servicios_de_fondo()
 
 # --- 💡 Lógica de Generación de Rutina General Unificada ---
 
+# Mapeo de compatibilidad con valores antiguos
+FRECUENCIA_MAP = {
+    'diaria': 'intermedia',
+    'solo_noche': 'basica', 
+    'minima': 'basica',
+    'basica': 'basica',
+    'intermedia': 'intermedia',
+    'avanzada': 'avanzada'
+}
+
+# Tabla declarativa de la rutina unificada, en el orden en que se aplican los pasos.
+# Cada paso lista sus variantes: gana la primera cuya condición se cumple.
+# Condiciones:
+#   ('piel', a, b)       -> el tipo de piel contiene alguno de los valores
+#   ('condicion', a)     -> el usuario marcó la condición
+#   ('frecuencia', a, b) -> la frecuencia normalizada es alguno de los valores
+#   ('con_condiciones',) -> el usuario marcó al menos una condición
+#   None                 -> siempre (variante por defecto)
+# 'requiere' (opcional): todas sus condiciones deben cumplirse para incluir el paso.
+REGLAS_RUTINA = (
+    {
+        'nombre': "Limpieza",  # Siempre necesario
+        'tipo_producto': "limpiador",
+        'variantes': (
+            (('piel', 'grasa', 'mixta'), "Usa un limpiador en gel o espuma para eliminar impurezas sin resecar"),
+            (None, "Usa un limpiador suave en crema o leche para limpiar sin dañar la barrera cutánea"),
+        ),
+    },
+    {
+        'nombre': "Exfoliación",  # Depende de frecuencia y condiciones
+        'tipo_producto': "exfoliante",
+        'requiere': (('frecuencia', 'avanzada', 'intermedia'), ('con_condiciones',)),
+        'variantes': (
+            (('condicion', 'acne'), "Exfolia 2-3 veces por semana con un producto que contenga Ácido Salicílico (BHA)"),
+            (('condicion', 'manchas'), "Exfolia 1-2 veces por semana con un producto que contenga Ácido Glicólico (AHA)"),
+            (None, "Exfolia 1-2 veces por semana con un exfoliante suave para renovar la piel"),
+        ),
+    },
+    {
+        'nombre': "Tratamiento",  # Personalizado por condiciones
+        'tipo_producto': "serum",
+        'variantes': (
+            (('condicion', 'acne'), "Aplica un serum con Niacinamida o Ácido Salicílico para controlar el acné"),
+            (('condicion', 'manchas'), "Aplica un serum con Vitamina C o Ácido Kójico para uniformar el tono"),
+            (('piel', 'seca'), "Aplica un serum hidratante con Ácido Hialurónico para reponer humedad"),
+            (None, "Aplica un serum antioxidante para proteger y mejorar la textura"),
+        ),
+    },
+    {
+        'nombre': "Hidratación",  # Siempre necesario
+        'tipo_producto': "crema_hidratante",
+        'variantes': (
+            (('piel', 'grasa'), "Usa una crema ligera en gel o textura oil-free que no obstruya poros"),
+            (('piel', 'seca'), "Usa una crema nutritiva con ceramidas para restaurar la barrera lipídica"),
+            (None, "Usa una crema de textura media que equilibre las zonas secas y grasas"),  # mixta o normal
+        ),
+    },
+    {
+        'nombre': "Protección Solar",  # SOLO si es de día, pero lo mantenemos como paso general
+        'tipo_producto': "protector_solar",
+        'variantes': (
+            (None, "Aplica protector solar FPS 30-50+ cada mañana. ¡Es el paso más importante!"),
+        ),
+    },
+)
+
+# Valores del formulario con los que se precalculan las plantillas al arrancar
+TIPOS_PIEL = ('seca', 'mixta', 'grasa', 'sensible', 'normal')
+CONDICIONES = ('acne', 'manchas', 'arrugas')
+
+
+def _cumple(condicion, tipo: str, frecuencia: str, condiciones: frozenset) -> bool:
+    """Evalúa una condición de REGLAS_RUTINA para un perfil normalizado."""
+    if condicion is None:
+        return True
+    clase, *valores = condicion
+    if clase == 'piel':
+        return any(valor in tipo for valor in valores)
+    if clase == 'condicion':
+        return any(valor in condiciones for valor in valores)
+    if clase == 'frecuencia':
+        return frecuencia in valores
+    if clase == 'con_condiciones':
+        return len(condiciones) > 0
+    raise ValueError(f"Condición de rutina desconocida: {condicion}")
+
+
+@lru_cache(maxsize=512)
+def plantilla_rutina(tipo: str, frecuencia: str, condiciones: frozenset) -> tuple:
+    """
+    Aplica REGLAS_RUTINA a un perfil normalizado y devuelve los pasos como
+    una tupla de mapeos de solo lectura. El resultado se memoiza: todos los
+    perfiles con la misma combinación comparten la misma plantilla.
+    """
+    pasos = []
+    for regla in REGLAS_RUTINA:
+        if not all(_cumple(c, tipo, frecuencia, condiciones) for c in regla.get('requiere', ())):
+            continue
+        for condicion, descripcion in regla['variantes']:
+            if _cumple(condicion, tipo, frecuencia, condiciones):
+                pasos.append(MappingProxyType({
+                    "orden": len(pasos) + 1,
+                    "nombre": regla['nombre'],
+                    "descripcion": descripcion,
+                    "tipo_producto": regla['tipo_producto']
+                }))
+                break
+    return tuple(pasos)
+
+
+def precalcular_plantillas_rutina():
+    """Compila al arrancar las plantillas de todas las combinaciones del formulario."""
+    for tipo in TIPOS_PIEL:
+        for frecuencia in set(FRECUENCIA_MAP.values()):
+            for n in range(len(CONDICIONES) + 1):
+                for combinacion in combinations(CONDICIONES, n):
+                    plantilla_rutina(tipo, frecuencia, frozenset(combinacion))
+
+
+precalcular_plantillas_rutina()
+
+
+def firma_perfil(perfil: PerfilUsuario) -> tuple:
+    """
+    (tipo de piel, frecuencia normalizada, condiciones): lo único de lo que
+    dependen la rutina y los productos recomendados.
+    """
+    tipo = perfil.tipo_piel.lower()
+    frecuencia = FRECUENCIA_MAP.get(perfil.frecuencia_rutina, 'basica')
+    condiciones = frozenset(c.lower() for c in perfil.get_condiciones_list())
+    return tipo, frecuencia, condiciones
+
+
+def semilla_recomendacion(perfil: PerfilUsuario):
+    """Semilla de diversidad del perfil, o None si la mezcla está desactivada."""
+    if not app.config['DIVERSITY_SHUFFLE']:
+        return None
+    return profile_seed(perfil.tipo_piel, perfil.condiciones)
+
+
 def generar_rutina_unificada(perfil: PerfilUsuario) -> RutinaPersonalizada:
     """
     Genera una rutina general personalizada basada en el perfil.
     Ahora devuelve un objeto RutinaPersonalizada en lugar de un dict separado.
+    Los pasos salen de la plantilla memoizada para (tipo de piel, frecuencia, condiciones).
     """
-    rutina = RutinaPersonalizada(perfil)
-    tipo = perfil.tipo_piel.lower()
-    condiciones_list = perfil.get_condiciones_list()
-    
-    # Mapeo de compatibilidad con valores antiguos
-    frecuencia_map = {
-        'diaria': 'intermedia',
-        'solo_noche': 'basica', 
-        'minima': 'basica',
-        'basica': 'basica',
-        'intermedia': 'intermedia',
-        'avanzada': 'avanzada'
-    }
-    
-    frecuencia = frecuencia_map.get(perfil.frecuencia_rutina, 'basica')
-    
-    # PASO 1: Limpieza (siempre necesario)
-    if 'grasa' in tipo or 'mixta' in tipo:
-        rutina.agregar_paso(
-            "Limpieza", 
-            "Usa un limpiador en gel o espuma para eliminar impurezas sin resecar",
-            "limpiador"
-        )
-    else:
-        rutina.agregar_paso(
-            "Limpieza", 
-            "Usa un limpiador suave en crema o leche para limpiar sin dañar la barrera cutánea",
-            "limpiador"
-        )
-    
-    # PASO 2: Exfoliación (depende de frecuencia y condiciones)
-    if frecuencia in ['avanzada', 'intermedia'] and len(condiciones_list) > 0:
-        if 'acne' in [c.lower() for c in condiciones_list]:
-            rutina.agregar_paso(
-                "Exfoliación", 
-                "Exfolia 2-3 veces por semana con un producto que contenga Ácido Salicílico (BHA)",
-                "exfoliante"
-            )
-        elif 'manchas' in [c.lower() for c in condiciones_list]:
-            rutina.agregar_paso(
-                "Exfoliación", 
-                "Exfolia 1-2 veces por semana con un producto que contenga Ácido Glicólico (AHA)",
-                "exfoliante"
-            )
-        else:
-            rutina.agregar_paso(
-                "Exfoliación", 
-                "Exfolia 1-2 veces por semana con un exfoliante suave para renovar la piel",
-                "exfoliante"
-            )
-    
-    # PASO 3: Tratamiento/Serum (personalizado por condiciones)
-    if 'acne' in [c.lower() for c in condiciones_list]:
-        rutina.agregar_paso(
-            "Tratamiento", 
-            "Aplica un serum con Niacinamida o Ácido Salicílico para controlar el acné",
-            "serum"
-        )
-    elif 'manchas' in [c.lower() for c in condiciones_list]:
-        rutina.agregar_paso(
-            "Tratamiento", 
-            "Aplica un serum con Vitamina C o Ácido Kójico para uniformar el tono",
-            "serum"
-        )
-    elif 'seca' in tipo:
-        rutina.agregar_paso(
-            "Tratamiento", 
-            "Aplica un serum hidratante con Ácido Hialurónico para reponer humedad",
-            "serum"
-        )
-    else:
-        rutina.agregar_paso(
-            "Tratamiento", 
-            "Aplica un serum antioxidante para proteger y mejorar la textura",
-            "serum"
-        )
-    
-    # PASO 4: Hidratación (siempre necesario)
-    if 'grasa' in tipo:
-        rutina.agregar_paso(
-            "Hidratación", 
-            "Usa una crema ligera en gel o textura oil-free que no obstruya poros",
-            "crema_hidratante"
-        )
-    elif 'seca' in tipo:
-        rutina.agregar_paso(
-            "Hidratación", 
-            "Usa una crema nutritiva con ceramidas para restaurar la barrera lipídica",
-            "crema_hidratante"
-        )
-    else:  # mixta o normal
-        rutina.agregar_paso(
-            "Hidratación", 
-            "Usa una crema de textura media que equilibre las zonas secas y grasas",
-            "crema_hidratante"
-        )
-    
-    # PASO 5: Protección Solar (SOLO si es de día, pero lo mantenemos como paso general)
-    rutina.agregar_paso(
-        "Protección Solar", 
-        "Aplica protector solar FPS 30-50+ cada mañana. ¡Es el paso más importante!",
-        "protector_solar"
-    )
-    
-    return rutina
+    return RutinaPersonalizada.desde_plantilla(perfil, plantilla_rutina(*firma_perfil(perfil)))
 
 # --- Funciones de Base de Datos ---
 
 def guardar_perfil_db(perfil: PerfilUsuario) -> bool:
-    """Guarda el objeto PerfilUsuario en la base de datos."""
-    conn = get_db_connection()
-    if not conn:
-        flash("Error crítico: No se pudo conectar a la base de datos.", "error")
-        return False
-
-    cursor = conn.cursor()
-    sql = """INSERT INTO perfiles (nombre, edad, tipo_piel, condiciones, frecuencia_rutina)
-             VALUES (?, ?, ?, ?, ?)"""
+    """
+    Guarda el objeto PerfilUsuario en la base de datos (conexión del pool).
+    En modo asíncrono solo lo encola; el escritor de fondo lo guarda por lotes.
+    """
     valores = (perfil.nombre, perfil.edad, perfil.tipo_piel, perfil.condiciones, perfil.frecuencia_rutina)
 
+    if PROFILE_WRITER.running:
+        if PROFILE_WRITER.submit(valores):
+            return True
+        flash("El servidor está ocupado guardando perfiles. Inténtalo de nuevo en unos segundos.", "error")
+        return False
+
     try:
-        cursor.execute(sql, valores)
-        conn.commit()
+        insertar_perfil(valores)
         return True
     except sqlite3.Error as e:
         print(f"Error al guardar en BD: {e}")
         flash(f"Error al guardar en la base de datos: {e}", "error")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 # --- Rutas de la Aplicación Web ---
 
@@ -165,31 +253,37 @@ def procesar_formulario():
     """
     try:
         # 1. Extracción y validación básica de datos
-        nombre = request.form['nombre']
-        edad = int(request.form['edad'])
-        tipo_piel = request.form['tipo_piel']
-        condiciones_list = request.form.getlist('condiciones')
-        condiciones_str = ", ".join(condiciones_list) if condiciones_list else "Ninguna"
-        frecuencia = request.form['frecuencia_rutina']
+        with span('formulario'):
+            nombre = request.form['nombre']
+            edad = int(request.form['edad'])
+            tipo_piel = request.form['tipo_piel']
+            condiciones_list = request.form.getlist('condiciones')
+            condiciones_str = ", ".join(condiciones_list) if condiciones_list else "Ninguna"
+            frecuencia = request.form['frecuencia_rutina']
 
-        # 2. Creación del objeto PerfilUsuario
-        perfil_usuario = PerfilUsuario(nombre, edad, tipo_piel, condiciones_str, frecuencia)
+            # 2. Creación del objeto PerfilUsuario
+            perfil_usuario = PerfilUsuario(nombre, edad, tipo_piel, condiciones_str, frecuencia)
 
         # 3. Guardar perfil en la Base de Datos
-        if not guardar_perfil_db(perfil_usuario):
+        with span('guardar_perfil'):
+            guardado = guardar_perfil_db(perfil_usuario)
+        if not guardado:
             return redirect(url_for('index'))
 
         # 4. Generar la rutina UNIFICADA (nueva función)
-        rutina_personalizada = generar_rutina_unificada(perfil_usuario)
+        with span('rutina'):
+            rutina_personalizada = generar_rutina_unificada(perfil_usuario)
         
         # 5. Generar los Productos Recomendados (USANDO LA NUEVA FUNCIÓN)
         try:
             # Usar la nueva función que se conecta con la rutina
-            productos_recomendados = recommend_products_for_routine(
-                rutina_personalizada, 
-                perfil_usuario.tipo_piel, 
-                perfil_usuario.condiciones
-            )
+            with span('recomendacion'):
+                productos_recomendados = recommend_products_for_routine(
+                    rutina_personalizada, 
+                    perfil_usuario.tipo_piel, 
+                    perfil_usuario.condiciones,
+                    seed=semilla_recomendacion(perfil_usuario)
+                )
             
             # Asignamos los productos a la rutina
             rutina_personalizada.productos_recomendados = productos_recomendados
@@ -200,7 +294,11 @@ def procesar_formulario():
             print(f"ERROR en recommend_products_for_routine: {e}")
             # Fallback a la función original si hay error
             try:
-                productos_recomendados = recommend_products(perfil_usuario.tipo_piel, perfil_usuario.condiciones, limit=6)
+                with span('recomendacion_basica'):
+                    productos_recomendados = recommend_products(
+                        perfil_usuario.tipo_piel, perfil_usuario.condiciones, limit=6,
+                        seed=semilla_recomendacion(perfil_usuario)
+                    )
                 rutina_personalizada.productos_recomendados = productos_recomendados
                 flash("Advertencia: Se usó el modo de recomendación básico.", "warning")
             except Exception as fallback_error:
@@ -208,10 +306,11 @@ def procesar_formulario():
                 flash("Advertencia: No se pudieron cargar los productos recomendados. Revisar el archivo de datos (CSV).", "warning")
 
         # 6. Mostrar la página de resultados con la rutina unificada
-        return render_template('resultados.html', 
-                               perfil=perfil_usuario, 
-                               rutina=rutina_personalizada,
-                               productos=rutina_personalizada.productos_recomendados)
+        with span('render'):
+            return render_template('resultados.html', 
+                                   perfil=perfil_usuario, 
+                                   rutina=rutina_personalizada,
+                                   productos=rutina_personalizada.productos_recomendados)
                                
     except ValueError:
         flash("Error de datos: Asegúrate de que la edad sea un número válido.", "error")
@@ -225,6 +324,213 @@ def procesar_formulario():
         flash(f"Ocurrió un error inesperado al procesar tu perfil: {e}", "error")
         return redirect(url_for('index'))
 
+def _perfil_desde_json(datos: dict) -> PerfilUsuario:
+    """
+    Construye un PerfilUsuario a partir de un objeto JSON de la API.
+    'condiciones' puede ser una lista o una cadena separada por comas.
+    Lanza KeyError/ValueError/TypeError si faltan campos o no son válidos.
+    """
+    if not isinstance(datos, dict):
+        raise TypeError("cada perfil debe ser un objeto JSON")
+    condiciones = datos.get('condiciones') or []
+    if isinstance(condiciones, str):
+        condiciones_str = condiciones or "Ninguna"
+    else:
+        condiciones_str = ", ".join(str(c) for c in condiciones) if condiciones else "Ninguna"
+    return PerfilUsuario(
+        str(datos.get('nombre', '')),
+        int(datos.get('edad', 0)),
+        str(datos['tipo_piel']),
+        condiciones_str,
+        str(datos['frecuencia_rutina'])
+    )
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def recomendar_lote():
+    """
+    Recomendación en lote para integraciones: recibe {"profiles": [...]}
+    (o directamente la lista) y responde NDJSON, una línea por perfil en el
+    mismo orden. Los perfiles con la misma firma (tipo de piel, frecuencia,
+    condiciones) comparten rutina y productos, que se calculan y serializan
+    una sola vez por grupo. Los perfiles no se guardan en la base de datos.
+    """
+    datos = request.get_json(silent=True)
+    perfiles = datos.get('profiles') if isinstance(datos, dict) else datos
+    if not isinstance(perfiles, list):
+        return jsonify({'error': "Se esperaba una lista de perfiles en 'profiles'"}), 400
+    if len(perfiles) > app.config['MAX_BATCH_PROFILES']:
+        return jsonify({'error': f"Máximo {app.config['MAX_BATCH_PROFILES']} perfiles por petición"}), 413
+
+    def generar():
+        grupos = {}  # firma -> (número de grupo, JSON de rutina y productos)
+        for i, datos_perfil in enumerate(perfiles):
+            id_perfil = datos_perfil.get('id') if isinstance(datos_perfil, dict) else None
+            try:
+                perfil = _perfil_desde_json(datos_perfil)
+            except (KeyError, ValueError, TypeError) as e:
+                yield json.dumps({'index': i, 'id': id_perfil, 'error': f"Perfil inválido: {e}"}, ensure_ascii=False) + '\n'
+                continue
+
+            firma = firma_perfil(perfil)
+            if firma not in grupos:
+                with span('rutina'):
+                    rutina = generar_rutina_unificada(perfil)
+                with span('recomendacion'):
+                    productos = recommend_products_for_routine(
+                        rutina, perfil.tipo_piel, perfil.condiciones, seed=semilla_recomendacion(perfil)
+                    )
+                resultado = json.dumps({'rutina': rutina.to_dict()['pasos'], 'productos': productos}, ensure_ascii=False)
+                grupos[firma] = (len(grupos), resultado)
+
+            grupo, resultado = grupos[firma]
+            yield '{"index": %d, "id": %s, "grupo": %d, "resultado": %s}\n' % (
+                i, json.dumps(id_perfil, ensure_ascii=False), grupo, resultado
+            )
+
+    return Response(stream_with_context(generar()), mimetype='application/x-ndjson')
+
+@app.route('/api/products/search')
+def buscar_productos():
+    """
+    Búsqueda de productos (JSON). Parámetros: q (el último término se busca
+    como prefijo), category, skin_type, brand, page y per_page.
+    """
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+    except ValueError:
+        return jsonify({'error': "'page' y 'per_page' deben ser números enteros"}), 400
+
+    with span('busqueda'):
+        resultado = search_products(
+            request.args.get('q', ''),
+            category=request.args.get('category'),
+            skin_type=request.args.get('skin_type'),
+            brand=request.args.get('brand'),
+            page=page,
+            per_page=per_page
+        )
+    return jsonify({
+        'query': request.args.get('q', ''),
+        'total': resultado.total,
+        'page': resultado.page,
+        'per_page': resultado.per_page,
+        'pages': -(-resultado.total // resultado.per_page),
+        'results': resultado.results
+    })
+
+@app.route('/api/products/<asin>/similar')
+def productos_similares(asin):
+    """
+    Productos parecidos (JSON) al del ASIN indicado (el 'asin' de cada
+    producto recomendado o encontrado), de su misma categoría. El ASIN no
+    cambia entre versiones del catálogo. Parámetro opcional: limit.
+    """
+    catalogo = CATALOG_MANAGER.current
+    limite = min(max(1, request.args.get('limit', SIMILAR_K, type=int)), SIMILAR_K)
+    try:
+        posicion = catalogo.position_of(asin)
+    except KeyError:
+        return jsonify({'error': f"No existe el producto {asin}"}), 404
+    with span('similares'):
+        similares = similar_products(posicion, limite, catalog=catalogo)
+    return jsonify({
+        'asin': asin,
+        'catalog_version': catalogo.version,
+        'product': catalogo.records[posicion],
+        'similar': similares
+    })
+
+def solo_admin(vista):
+    """
+    Protege una ruta de administración: exige el token de ADMIN_TOKEN o, si
+    no hay token configurado, que la petición venga de localhost.
+    """
+    @wraps(vista)
+    def protegida(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if token:
+            enviado = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+            if not hmac.compare_digest(enviado.encode(), token.encode()):
+                return jsonify({'error': "Token de administración inválido"}), 401
+        elif request.remote_addr not in ('127.0.0.1', '::1'):
+            return jsonify({'error': "Solo disponible desde localhost (o configura SKINFIT_ADMIN_TOKEN)"}), 403
+        return vista(*args, **kwargs)
+    return protegida
+
+@app.route('/admin/catalogo')
+@solo_admin
+def estado_catalogo():
+    """Versión del catálogo vigente, cuándo se cargó y cuánto tardó (JSON)."""
+    return jsonify(CATALOG_MANAGER.status())
+
+@app.route('/metrics')
+def metricas():
+    """Latencias por etapa y contadores en formato de texto de Prometheus."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Instrumentación de las peticiones ---
+
+@app.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    g.token_tiempos = start_request_timing()
+
+@app.after_request
+def registrar_medicion(response):
+    """Registra la latencia total y, si se pidió, añade la cabecera Server-Timing."""
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is None:
+        return response
+    total = time.perf_counter() - inicio
+    tiempos = finish_request_timing(g.pop('token_tiempos'))
+
+    endpoint = request.endpoint or 'desconocido'
+    REGISTRY.observe('skinfit_request_seconds', total, 'Latencia total por endpoint', endpoint=endpoint)
+    REGISTRY.inc('skinfit_requests_total', 1, 'Peticiones atendidas', endpoint=endpoint, status=response.status_code)
+
+    if app.config['TIMING_HEADER'] and request.headers.get('X-SkinFit-Timing') == '1':
+        response.headers['Server-Timing'] = server_timing_header(tiempos, total)
+    return response
+
+def metricas_servicio():
+    """Estado del catálogo, la caché de candidatos y el escritor de perfiles para /metrics."""
+    catalogo = CATALOG_MANAGER.status()
+    cache = get_cache_stats()
+    etapas = get_stage_stats()
+    escritor = PROFILE_WRITER.stats()
+    proceso = {'pid': os.getpid()}
+    return [
+        ('skinfit_process_resident_memory_bytes', 'gauge', 'Memoria residente de este worker',
+         [(proceso, process_memory_bytes())]),
+        ('skinfit_process_private_memory_bytes', 'gauge',
+         'Memoria propia de este worker (sin las páginas compartidas con otros procesos)',
+         [(proceso, process_private_memory_bytes())]),
+        ('skinfit_catalog_memory_bytes', 'gauge', 'Memoria aproximada del catálogo vigente',
+         [(proceso, catalogo['memory_bytes'])]),
+        ('skinfit_catalog_info', 'gauge', 'Versión del catálogo vigente',
+         [({'version': catalogo['version'], 'source': catalogo['source']}, 1)]),
+        ('skinfit_catalog_products', 'gauge', 'Productos en el catálogo vigente', [({}, catalogo['products'])]),
+        ('skinfit_catalog_load_seconds', 'gauge', 'Duración de la última carga del catálogo',
+         [({}, catalogo['load_seconds'])]),
+        ('skinfit_candidate_cache_hits_total', 'counter', 'Aciertos de la caché de candidatos', [({}, cache['hits'])]),
+        ('skinfit_candidate_cache_misses_total', 'counter', 'Fallos de la caché de candidatos', [({}, cache['misses'])]),
+        ('skinfit_candidate_cache_size', 'gauge', 'Entradas en la caché de candidatos', [({}, cache['size'])]),
+        ('skinfit_recommend_lookups_total', 'counter', 'Búsquedas de candidatos por categoría',
+         [({}, etapas['lookups'])]),
+        ('skinfit_recommend_tier_total', 'counter', 'Búsquedas resueltas en cada nivel de relajación',
+         [({'tier': tier}, n) for tier, n in sorted(etapas['tiers'].items())]),
+        ('skinfit_routine_fallbacks_total', 'counter', 'Pasos de rutina que usaron productos generales',
+         [({}, etapas['routine_fallbacks'])]),
+        ('skinfit_profile_writer_queued', 'gauge', 'Perfiles en cola de escritura', [({}, escritor['queued'])]),
+        ('skinfit_profile_writer_written_total', 'counter', 'Perfiles guardados por el escritor de fondo',
+         [({}, escritor['written'])]),
+        ('skinfit_profile_writer_failed_total', 'counter', 'Perfiles que no se pudieron guardar',
+         [({}, escritor['failed'])]),
+    ]
+
+REGISTRY.register_collector(metricas_servicio)
+
 # --- Ejecución de la Aplicación ---
 
 if __name__ == '__main__':
@@ -0,0 +1,61 @@
+# benchmarks/bench_catalog_startup.py
+# Compara el tiempo de carga del catálogo: CSV + limpieza vs instantánea binaria.
+#
+# Uso:
+#   python benchmarks/bench_catalog_startup.py
+#   python benchmarks/bench_catalog_startup.py --scales 1 10 100 --repeat 5
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from ai_service import recommender
+from ai_service.snapshot import snapshot_path
+from benchmarks.synthetic import load_base_catalog, write_synthetic_csv
+
+
+def _timed(func, repeat):
+    """Ejecuta func `repeat` veces (sin imprimir) y devuelve la mediana en ms."""
+    samples = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(scales, repeat):
+    # Catálogos sintéticos (títulos y ASIN distintos): con copias exactas del CSV
+    # la deduplicación las uniría y se mediría siempre el catálogo original
+    base = load_base_catalog(recommender.DATA_PATH)
+    print(f"{'filas':>10} {'csv+limpieza (ms)':>18} {'instantánea (ms)':>17} {'mejora':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            csv_path = os.path.join(tmp, f'skincare_x{scale}.csv')
+            write_synthetic_csv(csv_path, base, len(base) * scale)
+
+            cold = _timed(lambda: recommender.load_catalog_dataframe(csv_path, use_snapshot=False), repeat)
+            # Primera carga: limpia y escribe la instantánea
+            with contextlib.redirect_stdout(io.StringIO()):
+                rows = len(recommender.load_catalog_dataframe(csv_path))
+            warm = _timed(lambda: recommender.load_catalog_dataframe(csv_path), repeat)
+
+            print(f"{rows:>10} {cold:>18.1f} {warm:>17.1f} {cold / warm:>7.1f}x")
+            os.remove(snapshot_path(csv_path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de carga del catálogo')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.scales, args.repeat)
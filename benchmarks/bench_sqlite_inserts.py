@@ -0,0 +1,91 @@
+# benchmarks/bench_sqlite_inserts.py
+# Inserciones concurrentes de perfiles: una conexión nueva por inserción
+# (modo anterior, journal por defecto) vs pool de conexiones con WAL.
+#
+# Uso:
+#   python benchmarks/bench_sqlite_inserts.py --threads 8 --inserts 200
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+
+PERFIL = ('Ana', 28, 'mixta', 'acne, manchas', 'intermedia')
+
+
+def _insert_new_connection(path):
+    """Modo anterior: abrir, insertar, commit y cerrar en cada petición."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(database.SQL_INSERTAR_PERFIL, PERFIL)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run(insert, threads, inserts):
+    """Lanza `threads` hilos con `inserts` inserciones cada uno; devuelve (inserciones/s, errores)."""
+    errors = []
+
+    def worker():
+        for _ in range(inserts):
+            try:
+                insert()
+            except sqlite3.Error as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return (threads * inserts - len(errors)) / elapsed, len(errors)
+
+
+def run(threads, inserts):
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, 'antes.db')
+        new_path = os.path.join(tmp, 'ahora.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.crear_o_actualizar_tabla_perfiles(new_path)
+            database.crear_o_actualizar_tabla_perfiles(old_path)
+        # La base "antes" vuelve al journal por defecto (rollback)
+        conn = sqlite3.connect(old_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+        before, before_errors = _run(lambda: _insert_new_connection(old_path), threads, inserts)
+
+        pool = database.ConnectionPool(new_path)
+
+        def insert_pooled():
+            with pool.connection() as conn:
+                with conn:
+                    conn.execute(database.SQL_INSERTAR_PERFIL, PERFIL)
+
+        after, after_errors = _run(insert_pooled, threads, inserts)
+        pool.close_all()
+
+    print(f"{'modo':<32} {'inserciones/s':>14} {'errores':>8}")
+    print(f"{'conexión por inserción (DELETE)':<32} {before:>14.0f} {before_errors:>8}")
+    print(f"{'pool + WAL':<32} {after:>14.0f} {after_errors:>8}")
+    print(f"mejora: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de inserciones concurrentes en SQLite')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--inserts', type=int, default=200)
+    args = parser.parse_args()
+    run(args.threads, args.inserts)
@@ -0,0 +1,314 @@
+# benchmarks/bench_suite.py
+# Suite de rendimiento reproducible del recomendador y de /procesar.
+#
+# Para cada tamaño de catálogo sintético mide: carga desde CSV (limpieza +
+# categorías), carga desde instantánea, construcción del índice, recomendación
+# de una categoría, recomendación de una rutina completa, /procesar de punta
+# a punta con el cliente de pruebas de Flask y el cálculo de productos
+# similares (cómo escala con el catálogo) y su consulta. Además mide
+# inserciones en SQLite.
+# El resultado es un JSON que se puede comparar entre ejecuciones.
+#
+# Uso:
+#   python benchmarks/bench_suite.py --output antes.json
+#   python benchmarks/bench_suite.py --rows 1438 100000 1000000 --output despues.json
+#   python benchmarks/bench_suite.py --compare antes.json despues.json --threshold 0.10
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# La app no debe revisar el CSV real mientras se mide
+os.environ.setdefault('SKINFIT_CATALOG_POLL_SECONDS', '0')
+os.environ.setdefault('SKINFIT_LOG_LEVEL', 'ERROR')
+
+import numpy as np
+import pandas as pd
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as skinfit_app
+    import database
+    from ai_service import recommender
+    from ai_service.catalog import CATEGORY_KEYWORDS
+    from ai_service.similar import build_similar_index, similar_products
+    from metrics import process_memory_bytes
+    from models import PerfilUsuario
+
+from synthetic import load_base_catalog, write_synthetic_csv
+
+SUITE_VERSION = 1
+
+TIPOS_PIEL = ('grasa', 'seca', 'mixta', 'normal', 'sensible')
+CONCERNS = ('', 'acne', 'manchas', 'arrugas', 'acne, manchas')
+FRECUENCIAS = ('basica', 'intermedia', 'avanzada')
+PERFIL_DB = ('Ana', 28, 'mixta', 'acne, manchas', 'intermedia')
+
+
+def _quiet(func):
+    def wrapper(*args, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _measure(name, rows, func, repeat, before=None):
+    """
+    Ejecuta func `repeat` veces y devuelve una fila de resultados en ms.
+    `before` (opcional) se ejecuta antes de cada muestra sin medirse.
+    """
+    samples = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    median = statistics.median(samples)
+    result = {
+        'name': name,
+        'rows': rows,
+        'repeat': repeat,
+        'median_ms': round(median, 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        'min_ms': round(samples[0], 4),
+        'ops_per_s': round(1000 / median, 2) if median > 0 else None,
+    }
+    print(f"{name:<28} {rows if rows is not None else '-':>9} {median:>12.3f} {result['p95_ms']:>12.3f}",
+          file=sys.stderr)
+    return result
+
+
+def _profiles():
+    """Ciclo infinito y determinista de (tipo de piel, preocupación, categoría)."""
+    categories = tuple(CATEGORY_KEYWORDS) + (None,)
+    return itertools.cycle(itertools.product(TIPOS_PIEL, CONCERNS, categories))
+
+
+def bench_catalog(csv_path, rows, load_repeat):
+    results = []
+    load = _quiet(recommender.load_catalog_dataframe)
+    results.append(_measure('catalog_load_csv', rows, lambda: load(csv_path, use_snapshot=False), load_repeat))
+    df = load(csv_path)  # Escribe la instantánea
+    results.append(_measure('catalog_load_snapshot', rows, lambda: load(csv_path), load_repeat))
+    install = _quiet(recommender.set_catalog)
+    results.append(_measure('catalog_install', rows, lambda: install(df), load_repeat))
+    results[-1]['catalog_mb'] = round(recommender.get_catalog().memory_bytes / 2**20, 2)
+    results[-1]['rss_mb'] = round(process_memory_bytes() / 2**20, 2)
+    return results
+
+
+def bench_recommend(rows, repeat):
+    results = []
+    profiles = _profiles()
+    clear = recommender.CANDIDATE_CACHE.clear
+
+    def one_category():
+        skin, concern, category = next(profiles)
+        recommender.recommend_products_by_category(skin, concern, category, limit=3)
+
+    results.append(_measure('recommend_category_cold', rows, one_category, repeat, before=clear))
+    results.append(_measure('recommend_category_warm', rows, one_category, repeat))
+
+    perfiles = itertools.cycle(
+        PerfilUsuario('Bench', 30, skin, concern or 'Ninguna', frecuencia)
+        for skin, concern, frecuencia in itertools.product(TIPOS_PIEL, CONCERNS, FRECUENCIAS)
+    )
+
+    def routine():
+        perfil = next(perfiles)
+        rutina = skinfit_app.generar_rutina_unificada(perfil)
+        recommender.recommend_products_for_routine(rutina, perfil.tipo_piel, perfil.condiciones)
+
+    results.append(_measure('recommend_routine_cold', rows, routine, repeat, before=clear))
+    results.append(_measure('recommend_routine_warm', rows, routine, repeat))
+    return results
+
+
+def bench_procesar(rows, repeat):
+    client = skinfit_app.app.test_client()
+    forms = itertools.cycle(
+        {'nombre': 'Bench', 'edad': '30', 'tipo_piel': skin, 'frecuencia_rutina': frecuencia,
+         'condiciones': [c.strip() for c in concern.split(',') if c.strip()]}
+        for skin, concern, frecuencia in itertools.product(TIPOS_PIEL, CONCERNS, FRECUENCIAS)
+    )
+
+    def post():
+        response = client.post('/procesar', data=next(forms))
+        if response.status_code != 200:
+            raise RuntimeError(f"/procesar respondió {response.status_code}")
+
+    rss_before = process_memory_bytes()
+    results = [
+        _measure('procesar_e2e_cold', rows, post, repeat, before=recommender.CANDIDATE_CACHE.clear),
+        _measure('procesar_e2e_warm', rows, post, repeat),
+    ]
+    # La memoria del worker no debería crecer con el número de peticiones
+    results[-1]['rss_growth_mb'] = round((process_memory_bytes() - rss_before) / 2**20, 2)
+    return results
+
+
+def bench_similar(rows, repeat, load_repeat):
+    """Construcción de los vecinos (productos similares) y consulta de una fila."""
+    catalog = recommender.get_catalog()
+    results = [_measure('similar_build', rows, lambda: build_similar_index(catalog), load_repeat)]
+    neighbors = build_similar_index(catalog).neighbors
+    results[-1]['avg_neighbors'] = round(float((neighbors >= 0).sum(axis=1).mean()), 2)
+
+    positions = itertools.cycle(random.Random(0).sample(range(len(catalog)), min(len(catalog), 1000)))
+    results.append(_measure('similar_lookup', rows, lambda: similar_products(next(positions), catalog=catalog), repeat))
+    return results
+
+
+def bench_sqlite(inserts, threads):
+    """Inserciones por segundo: una a una, concurrentes con el pool y por lotes con ProfileWriter."""
+    results = []
+
+    single = _measure('sqlite_insert_single', None, lambda: database.insertar_perfil(PERFIL_DB), inserts)
+    results.append(single)
+
+    def concurrent():
+        workers = [
+            threading.Thread(target=lambda: [database.insertar_perfil(PERFIL_DB) for _ in range(inserts // threads)])
+            for _ in range(threads)
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+    result = _measure('sqlite_insert_concurrent', None, concurrent, 3)
+    result['inserts_per_s'] = round((inserts // threads) * threads * 1000 / result['median_ms'], 1)
+    results.append(result)
+
+    writer = database.ProfileWriter(database.DB_POOL, max_queue=inserts)
+    writer.start()
+
+    def batched():
+        for _ in range(inserts):
+            writer.submit(PERFIL_DB)
+        writer.flush()
+
+    result = _measure('sqlite_insert_writer', None, batched, 3)
+    result['inserts_per_s'] = round(inserts * 1000 / result['median_ms'], 1)
+    results.append(result)
+    writer.stop()
+
+    single['inserts_per_s'] = single['ops_per_s']
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    random.seed(args.seed)
+    base = load_base_catalog()
+    results = []
+    print(f"{'benchmark':<28} {'filas':>9} {'mediana ms':>12} {'p95 ms':>12}", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Base de datos temporal para /procesar y las inserciones
+        db_path = os.path.join(tmp, 'bench.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.crear_o_actualizar_tabla_perfiles(db_path)
+        database.DB_POOL = database.ConnectionPool(db_path)
+
+        for rows in args.rows:
+            csv_path = write_synthetic_csv(os.path.join(tmp, f'skincare_{rows}.csv'), base, rows, args.seed)
+            results.extend(bench_catalog(csv_path, rows, args.load_repeat))
+            results.extend(bench_recommend(rows, args.repeat))
+            results.extend(bench_procesar(rows, args.repeat))
+            results.extend(bench_similar(rows, args.repeat, args.load_repeat))
+            os.remove(csv_path)
+
+        if args.inserts > 0:
+            results.extend(bench_sqlite(args.inserts, args.threads))
+        database.DB_POOL.close_all()
+
+    return {
+        'suite_version': SUITE_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'params': {
+            'rows': args.rows, 'repeat': args.repeat, 'load_repeat': args.load_repeat,
+            'inserts': args.inserts, 'threads': args.threads, 'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def compare(old_path, new_path, threshold):
+    """Compara dos ejecuciones por (benchmark, filas). Devuelve 1 si alguna empeoró más que `threshold`."""
+    with open(old_path) as f:
+        old = {(r['name'], r['rows']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {(r['name'], r['rows']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"{'benchmark':<28} {'filas':>9} {'antes ms':>12} {'después ms':>12} {'cambio':>9}")
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[0], k[1] or 0)):
+        before, after = old[key]['median_ms'], new[key]['median_ms']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = '  ⚠️'
+        rows = key[1] if key[1] is not None else '-'
+        print(f"{key[0]:<28} {rows:>9} {before:>12.3f} {after:>12.3f} {change:>+8.1%}{flag}")
+    for key in sorted(old.keys() ^ new.keys(), key=lambda k: (k[0], k[1] or 0)):
+        print(f"{key[0]:<28} {key[1] if key[1] is not None else '-':>9}  solo en {'antes' if key in old else 'después'}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Suite de rendimiento de SkinFit')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1438, 10000, 100000],
+                        help='tamaños del catálogo sintético (hasta 1000000)')
+    parser.add_argument('--repeat', type=int, default=200, help='muestras por benchmark de recomendación')
+    parser.add_argument('--load-repeat', type=int, default=3, help='muestras por benchmark de carga')
+    parser.add_argument('--inserts', type=int, default=2000, help='inserciones de SQLite (0 = omitir)')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='archivo JSON de salida (por defecto, stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DESPUES'),
+                        help='compara dos ejecuciones en vez de medir')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='empeoramiento relativo de la mediana que cuenta como regresión')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,55 @@
+# benchmarks/synthetic.py
+# Catálogos sintéticos de cualquier tamaño a partir de data/skincare.csv.
+#
+# Las filas se toman al azar (con semilla) del CSV real. A partir de la
+# fila 1438 cada copia recibe un título distinto (presentación + número de
+# lote), un precio con ±20 % de variación y un ASIN propio, para que la
+# inferencia de categorías y la deduplicación no se salten el trabajo.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from ai_service.catalog import DATA_PATH
+
+PRESENTACIONES = ('50 Ml', '100 Ml', '150 Ml', '200 Ml', '30 G', '75 G', 'Pack Of 2', 'Travel Size')
+
+
+def load_base_catalog(path: str = DATA_PATH):
+    """El CSV real, sin limpiar (tal como lo lee el cargador)."""
+    return pd.read_csv(path)
+
+
+def make_synthetic_catalog(base, rows: int, seed: int = 0):
+    """
+    Devuelve un DataFrame crudo de `rows` filas con las mismas columnas que el CSV.
+    Si `rows` no supera el CSV real, son sus primeras filas sin cambios.
+    """
+    if rows <= len(base):
+        return base.head(rows).reset_index(drop=True)
+
+    rng = np.random.default_rng(seed)
+    extra = rows - len(base)
+    copies = base.iloc[rng.integers(0, len(base), extra)].reset_index(drop=True)
+
+    serial = pd.Series(np.arange(len(base), rows), dtype='int64').astype(str)
+    presentacion = pd.Series(rng.choice(PRESENTACIONES, extra))
+    copies['Title'] = copies['Title'].str.strip() + ', ' + presentacion + ' (Lote ' + serial + ')'
+    copies['Price'] = (copies['Price'] * rng.uniform(0.8, 1.2, extra)).round().astype('int64')
+    asins = 'S' + serial.str.zfill(9)
+    copies['Link'] = 'https://www.amazon.in/producto-sintetico/dp/' + asins + '/ref=sr_1_1'
+
+    df = pd.concat([base, copies], ignore_index=True)
+    if 'Unnamed: 0' in df.columns:
+        df['Unnamed: 0'] = np.arange(rows)
+    return df
+
+
+def write_synthetic_csv(path: str, base, rows: int, seed: int = 0) -> str:
+    """Escribe el catálogo sintético como CSV (mismo formato que data/skincare.csv)."""
+    make_synthetic_catalog(base, rows, seed).to_csv(path, index=False)
+    return path
@@ -1,109 +1,211 @@
 # dashboard.py (CON CSS EXTERNO)
 
-import pandas as pd
+import os
+import sqlite3
+from collections import Counter
+from itertools import combinations
+
 import dash
 from dash import dcc, html
 import plotly.express as px
 import plotly.graph_objects as go
-import os
 
-# 1. Cargar los datos reales
-try:
-    DATA_PATH = os.path.join('data', 'skincare.csv')
-    df = pd.read_csv(DATA_PATH)
-    print(f" Dashboard cargado: {len(df)} productos")
-    
-    # Limpieza básica
-    if 'Price' in df.columns:
-        df['Price'] = pd.to_numeric(df['Price'], errors='coerce').fillna(0)
-    if 'Brand' in df.columns:
-        df['Brand'] = df['Brand'].fillna('Marca desconocida')
-    if 'Skin_Type' in df.columns:
-        df['Skin_Type'] = df['Skin_Type'].fillna('All')
-        df['Skin_Type'] = df['Skin_Type'].str.replace('"', '').str.strip()
-    
-except Exception as e:
-    print(f" Error: {e}")
-    df = pd.DataFrame({
-        'Brand': ['Nivea', 'Cetaphil', 'Neutrogena'],
-        'Price': [300, 400, 350],
-        'Skin_Type': ['All', 'Combination', 'Normal']
-    })
+# 1. Datos: los agregados del mismo catálogo limpio que usa el recomendador,
+# cacheados por versión (se recalculan solo cuando cambia data/skincare.csv)
+from ai_service.aggregates import PRICE_HISTOGRAM_EDGES, get_catalog_aggregates
+from ai_service.catalog import CATALOG_MANAGER
+from database import (EDAD_RANGOS, contar_perfiles_con_condiciones, contar_perfiles_por_condicion,
+                      obtener_resumen_perfiles)
+
+# Cada cuántos segundos se revisa si cambió el catálogo (0 = no recargar)
+CATALOG_POLL_SECONDS = float(os.environ.get('SKINFIT_CATALOG_POLL_SECONDS', 30))
+if CATALOG_POLL_SECONDS > 0:
+    CATALOG_MANAGER.start_polling(CATALOG_POLL_SECONDS)
+
+print(f" Dashboard cargado: {get_catalog_aggregates().products} productos")
 
 # 2. Inicializar Dash
 app = dash.Dash(__name__, title="SkinFit Dashboard")
 
-# 3. Crear gráficos simples
-def create_visualizations():
-    """Crea gráficos básicos"""
+def _sin_datos():
+    fig = go.Figure()
+    fig.add_annotation(text="Datos no disponibles", x=0.5, y=0.5, showarrow=False)
+    return fig
+
+def _barras(counts, title, x_title, color, top=None):
+    """Gráfico de barras a partir de un Counter (ordenado de mayor a menor)."""
+    items = counts.most_common(top)
+    if not items:
+        return _sin_datos()
+    labels, values = zip(*items)
+    fig = px.bar(x=list(labels), y=list(values), title=title, color_discrete_sequence=[color])
+    fig.update_layout(xaxis_title=x_title, yaxis_title="Cantidad")
+    return fig
+
+# 3. Crear gráficos (una vez por versión del catálogo): la versión sale de los
+# mismos agregados que se grafican, así no se mezclan dos catálogos al recargar
+_graficos_catalogo = (None, None)  # (versión, gráficos) del último catálogo graficado
+
+def create_visualizations(aggregates):
+    """Crea los gráficos del catálogo a partir de sus agregados"""
+    global _graficos_catalogo
+    version, graficos = _graficos_catalogo
+    if graficos is not None and version == aggregates.version:
+        return graficos
     
-    # Gráfico 1: Distribución de precios
-    try:
-        fig_price = px.histogram(
-            df[df['Price'] < 500], 
-            x="Price",
-            title="Distribución de Precios",
-            nbins=15,
-            color_discrete_sequence=['#EC4899']
-        )
+    # Gráfico 1: Distribución de precios (histograma precalculado)
+    if aggregates.products:
+        fig_price = go.Figure(go.Bar(
+            x=(PRICE_HISTOGRAM_EDGES[:-1] + PRICE_HISTOGRAM_EDGES[1:]) / 2,
+            y=aggregates.price_counts,
+            width=PRICE_HISTOGRAM_EDGES[1:] - PRICE_HISTOGRAM_EDGES[:-1],
+            marker_color='#EC4899'
+        ))
         fig_price.update_layout(
+            title="Distribución de Precios",
             xaxis_title="Precio ($)",
-            yaxis_title="Cantidad de Productos"
+            yaxis_title="Cantidad de Productos",
+            bargap=0
         )
-    except:
-        fig_price = go.Figure()
-        fig_price.add_annotation(text="Datos no disponibles", x=0.5, y=0.5, showarrow=False)
+    else:
+        fig_price = _sin_datos()
 
     # Gráfico 2: Marcas más comunes
+    fig_brands = _barras(aggregates.brand_counts, "Marcas Más Comunes", "Marca", '#8B5CF6', top=6)
+
+    # Gráficos 3 y 4: Categorías inferidas y tipos de piel
+    fig_categories = _barras(aggregates.category_counts, "Productos por Categoría", "Categoría", '#EC4899')
+    fig_skin = _barras(aggregates.skin_type_counts, "Tipos de Piel", "Tipo de piel", '#8B5CF6', top=8)
+
+    graficos = (fig_price, fig_brands, fig_categories, fig_skin)
+    _graficos_catalogo = (aggregates.version, graficos)
+    return graficos
+
+# 4. Gráficos de perfiles: salen de la tabla de resúmenes de skinfit.db (unas
+# decenas de filas) y del índice por condición de perfil_condiciones, así que
+# se arman en cada visita sin recorrer 'perfiles'
+def create_profile_visualizations():
+    """Crea los gráficos de los perfiles registrados"""
     try:
-        brand_counts = df['Brand'].value_counts().head(6)
-        fig_brands = px.bar(
-            x=brand_counts.index,
-            y=brand_counts.values,
-            title="Marcas Más Comunes",
-            color_discrete_sequence=['#8B5CF6']
-        )
-        fig_brands.update_layout(
-            xaxis_title="Marca",
-            yaxis_title="Cantidad"
-        )
-    except:
-        fig_brands = go.Figure()
-        fig_brands.add_annotation(text="Datos no disponibles", x=0.5, y=0.5, showarrow=False)
+        resumen = obtener_resumen_perfiles()
+        condiciones = contar_perfiles_por_condicion()
+        # Perfiles con cada par de las condiciones más frecuentes
+        pares = Counter({
+            f"{a} + {b}": contar_perfiles_con_condiciones((a, b))
+            for a, b in combinations(sorted(c for c, _ in condiciones.most_common(5)), 2)
+        })
+    except sqlite3.Error as e:
+        print(f" No se pudieron leer los resúmenes de perfiles: {e}")
+        return _sin_datos(), _sin_datos(), _sin_datos(), _sin_datos(), _sin_datos(), 0
 
-    return fig_price, fig_brands
+    fig_skin_mix = _barras(resumen['tipo_piel'], "Perfiles por Tipo de Piel", "Tipo de piel", '#EC4899')
+    fig_conditions = _barras(condiciones, "Condiciones Más Frecuentes", "Condición", '#8B5CF6', top=10)
+    fig_pairs = _barras(+pares, "Condiciones que Aparecen Juntas", "Condiciones", '#EC4899')
 
-# 4. Layout simple con CSS externo
-fig_price, fig_brands = create_visualizations()
+    # Rangos de edad en su orden natural, no por cantidad
+    edades = resumen['edad']
+    if edades:
+        fig_ages = px.bar(x=[etiqueta for _, etiqueta in EDAD_RANGOS],
+                          y=[edades.get(etiqueta, 0) for _, etiqueta in EDAD_RANGOS],
+                          title="Perfiles por Edad", color_discrete_sequence=['#EC4899'])
+        fig_ages.update_layout(xaxis_title="Edad", yaxis_title="Cantidad")
+    else:
+        fig_ages = _sin_datos()
 
-app.layout = html.Div([
-    # Header
-    html.Div([
-        html.H1("SkinFit Dashboard", className='dashboard-title'),
-        html.P("Análisis de datos del catálogo de productos", className='dashboard-subtitle')
-    ], className='dashboard-header'),
-    
-    # Gráficos
-    html.Div([
+    dias = sorted(resumen['dia'].items())
+    if dias:
+        fechas, totales = zip(*dias)
+        fig_days = px.line(x=list(fechas), y=list(totales), title="Perfiles Registrados por Día",
+                           markers=True, color_discrete_sequence=['#8B5CF6'])
+        fig_days.update_layout(xaxis_title="Fecha", yaxis_title="Perfiles")
+    else:
+        fig_days = _sin_datos()
+
+    return fig_skin_mix, fig_conditions, fig_ages, fig_days, fig_pairs, sum(resumen['tipo_piel'].values())
+
+# 5. Layout simple con CSS externo (se arma en cada visita con el catálogo vigente)
+def serve_layout():
+    aggregates = get_catalog_aggregates()
+    fig_price, fig_brands, fig_categories, fig_skin = create_visualizations(aggregates)
+    fig_skin_mix, fig_conditions, fig_ages, fig_days, fig_pairs, total_perfiles = create_profile_visualizations()
+
+    return html.Div([
+        # Header
         html.Div([
-            dcc.Graph(id='price-distribution', figure=fig_price)
-        ], className='graph-container'),
+            html.H1("SkinFit Dashboard", className='dashboard-title'),
+            html.P("Análisis de datos del catálogo de productos", className='dashboard-subtitle')
+        ], className='dashboard-header'),
         
+        # Gráficos
         html.Div([
-            dcc.Graph(id='top-brands', figure=fig_brands)
-        ], className='graph-container')
-    ], className='graphs-row'),
-    
-    # Información
-    html.Div([
-        html.P([
-            f"Total productos: {len(df)} | ",
-            f"Marcas únicas: {df['Brand'].nunique() if 'Brand' in df.columns else 'N/A'}"
-        ], className='dataset-info')
+            html.Div([
+                dcc.Graph(id='price-distribution', figure=fig_price)
+            ], className='graph-container'),
+            
+            html.Div([
+                dcc.Graph(id='top-brands', figure=fig_brands)
+            ], className='graph-container')
+        ], className='graphs-row'),
+        
+        html.Div([
+            html.Div([
+                dcc.Graph(id='category-distribution', figure=fig_categories)
+            ], className='graph-container'),
+            
+            html.Div([
+                dcc.Graph(id='skin-type-distribution', figure=fig_skin)
+            ], className='graph-container')
+        ], className='graphs-row'),
+        
+        # Información
+        html.Div([
+            html.P([
+                f"Total productos: {aggregates.products} | ",
+                f"Marcas únicas: {len(aggregates.brand_counts)} | ",
+                f"Versión del catálogo: {aggregates.version}"
+            ], className='dataset-info')
+        ]),
+
+        # Perfiles de usuarios
+        html.Div([
+            html.H2("Perfiles de Usuarios", className='dashboard-title'),
+            html.P("Tendencias de los formularios enviados", className='dashboard-subtitle')
+        ], className='dashboard-header'),
+
+        html.Div([
+            html.Div([
+                dcc.Graph(id='profile-skin-types', figure=fig_skin_mix)
+            ], className='graph-container'),
+
+            html.Div([
+                dcc.Graph(id='profile-conditions', figure=fig_conditions)
+            ], className='graph-container')
+        ], className='graphs-row'),
+
+        html.Div([
+            html.Div([
+                dcc.Graph(id='profile-ages', figure=fig_ages)
+            ], className='graph-container'),
+
+            html.Div([
+                dcc.Graph(id='profile-submissions', figure=fig_days)
+            ], className='graph-container')
+        ], className='graphs-row'),
+
+        html.Div([
+            html.Div([
+                dcc.Graph(id='profile-condition-pairs', figure=fig_pairs)
+            ], className='graph-container')
+        ], className='graphs-row'),
+
+        html.Div([
+            html.P(f"Total perfiles: {total_perfiles}", className='dataset-info')
+        ])
     ])
-])
 
-# 5. CSS externo
+app.layout = serve_layout
+
+# 6. CSS externo
 app.index_string = '''
 <!DOCTYPE html>
 <html>
@@ -1,32 +1,305 @@
 # database.py
 # Gestiona la conexión y la creación/actualización de la tabla 'perfiles'.
+import atexit
+import queue
 import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
 
 # Nombre del archivo de la base de datos
 DATABASE_NAME = 'skinfit.db'
 
+# Espera máxima (ms) cuando otro proceso tiene la base bloqueada
+BUSY_TIMEOUT_MS = 5000
 
-def get_db_connection():
+# Sentencias reutilizadas: sqlite3 guarda la versión preparada en cada conexión
+SQL_INSERTAR_PERFIL = """INSERT INTO perfiles (nombre, edad, tipo_piel, condiciones, frecuencia_rutina)
+                         VALUES (?, ?, ?, ?, ?)"""
+
+# Resúmenes de perfiles para el dashboard: una fila por (dimensión, valor) con
+# su total. Se actualizan en la misma transacción que cada inserción, así los
+# gráficos leen unas decenas de filas en vez de recorrer 'perfiles' completa.
+# Dimensiones: 'dia' (AAAA-MM-DD, UTC como fecha_registro), 'tipo_piel' y
+# 'edad' (rango de EDAD_RANGOS). Las condiciones se cuentan en perfil_condiciones.
+SQL_SUMAR_RESUMEN = """INSERT INTO resumen_perfiles (dimension, valor, total) VALUES (?, ?, ?)
+                       ON CONFLICT (dimension, valor) DO UPDATE SET total = total + excluded.total"""
+
+# Rangos de edad del dashboard: (edad mínima, etiqueta), de menor a mayor
+EDAD_RANGOS = ((0, '<18'), (18, '18-24'), (25, '25-34'), (35, '35-44'), (45, '45-54'), (55, '55+'))
+
+
+def rango_edad(edad: int) -> str:
+    """Etiqueta del rango de EDAD_RANGOS al que pertenece una edad."""
+    etiqueta = EDAD_RANGOS[0][1]
+    for minima, nombre in EDAD_RANGOS:
+        if edad < minima:
+            break
+        etiqueta = nombre
+    return etiqueta
+
+
+def separar_condiciones(condiciones: str) -> list:
+    """Condiciones normalizadas de la cadena guardada (ej: "acne, manchas" -> ['acne', 'manchas'])."""
+    if not condiciones or condiciones.strip().lower() == 'ninguna':
+        return []
+    return list(dict.fromkeys(c.strip().lower() for c in condiciones.split(',') if c.strip()))
+
+
+def _conteos_resumen(filas, dia: str) -> Counter:
+    """Totales por (dimensión, valor) de un lote de filas para SQL_INSERTAR_PERFIL."""
+    conteos = Counter()
+    for _, edad, tipo_piel, _, _ in filas:
+        conteos['dia', dia] += 1
+        conteos['tipo_piel', tipo_piel.strip().lower()] += 1
+        conteos['edad', rango_edad(int(edad))] += 1
+    return conteos
+
+
+SQL_INSERTAR_CONDICION = """INSERT OR IGNORE INTO perfil_condiciones (perfil_id, condicion) VALUES (?, ?)"""
+
+
+def _guardar_condiciones(conn, filas):
+    """
+    Guarda en perfil_condiciones una fila por (perfil, condición) del lote
+    recién insertado. Los ids son consecutivos y terminan en last_insert_rowid():
+    la transacción tiene el bloqueo de escritura, nadie más inserta en medio.
+    """
+    ultimo_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    primer_id = ultimo_id - len(filas) + 1
+    conn.executemany(SQL_INSERTAR_CONDICION, [
+        (primer_id + i, condicion)
+        for i, fila in enumerate(filas)
+        for condicion in separar_condiciones(fila[3])
+    ])
+
+
+def _sumar_resumenes(conn, filas):
+    """Suma un lote de perfiles recién insertados a resumen_perfiles (dentro de la misma transacción)."""
+    dia = time.strftime('%Y-%m-%d', time.gmtime())
+    conn.executemany(SQL_SUMAR_RESUMEN, [
+        (dimension, valor, total) for (dimension, valor), total in _conteos_resumen(filas, dia).items()
+    ])
+
+
+def _open_connection(database: str):
+    """
+    Abre una conexión configurada para escrituras concurrentes:
+    WAL (los lectores no bloquean al escritor), synchronous=NORMAL
+    (seguro con WAL), busy_timeout para esperar en vez de fallar con
+    "database is locked" y foreign_keys (SQLite las trae apagadas por
+    conexión; sin ellas no se aplica el ON DELETE CASCADE de
+    perfil_condiciones).
+    """
+    conn = sqlite3.connect(
+        database,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,  # El pool la presta a distintos hilos, nunca a dos a la vez
+        cached_statements=256
+    )
+    # Configuración clave: permite acceder a las filas como diccionarios (por nombre de columna)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite reutilizables. Cada petición toma una conexión
+    libre (o abre una nueva) y la devuelve al terminar, así se evita abrir
+    el archivo y preparar las sentencias en cada inserción.
+    """
+
+    def __init__(self, database: str = DATABASE_NAME, max_size: int = 8):
+        self.database = database
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión del pool; se devuelve al salir del bloque."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = _open_connection(self.database)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close_all(self):
+        """Cierra las conexiones libres (por ejemplo, al apagar la aplicación)."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+DB_POOL = ConnectionPool(DATABASE_NAME)
+
+
+def get_db_connection(database: str = None):
     """
     Establece y retorna una conexión a la base de datos SQLite.
     Retorna None en caso de error de conexión.
     """
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        # Configuración clave: permite acceder a las filas como diccionarios (por nombre de columna)
-        conn.row_factory = sqlite3.Row 
+        conn = _open_connection(database or DATABASE_NAME)
         # print("Conexión a la base de datos establecida.") # Desactivado para no saturar la terminal
         return conn
     except sqlite3.Error as e:
         print(f"Error al conectar con la base de datos: {e}")
         return None
 
-def crear_o_actualizar_tabla_perfiles():
+
+def insertar_perfil(valores: tuple):
+    """
+    Inserta un perfil (nombre, edad, tipo_piel, condiciones, frecuencia_rutina)
+    usando una conexión del pool. Lanza sqlite3.Error si falla.
+    """
+    with DB_POOL.connection() as conn:
+        with conn:  # commit al terminar, rollback si hay error
+            conn.execute(SQL_INSERTAR_PERFIL, valores)
+            _guardar_condiciones(conn, (valores,))
+            _sumar_resumenes(conn, (valores,))
+
+class ProfileWriter:
+    """
+    Persistencia asíncrona (write-behind) de perfiles.
+    Las peticiones dejan el perfil en una cola acotada y siguen; un hilo de
+    fondo los escribe en lotes (executemany en una sola transacción) cuando
+    se juntan `batch_size` perfiles o pasan `flush_interval` segundos.
+    Si la cola está llena, submit() espera (backpressure) hasta `timeout`.
+    stop() escribe todo lo pendiente antes de terminar.
+    """
+
+    def __init__(self, pool: ConnectionPool = DB_POOL, max_queue: int = 1000,
+                 batch_size: int = 100, flush_interval: float = 1.0):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Arranca el hilo escritor (y el vaciado de la cola al salir del proceso)."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='profile-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def submit(self, valores: tuple, timeout: float = 5.0) -> bool:
+        """
+        Encola un perfil. Si la cola está llena espera hasta `timeout` segundos;
+        devuelve False si no hubo espacio (el llamador decide qué hacer).
+        """
+        try:
+            self._queue.put(valores, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self):
+        """Bloquea hasta que todo lo encolado hasta ahora esté escrito."""
+        self._queue.join()
+
+    def stop(self):
+        """Escribe lo pendiente y detiene el hilo escritor."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+            elif self._stopping.is_set():
+                return
+
+    def _next_batch(self) -> list:
+        """Junta perfiles hasta llenar un lote o hasta que venza el intervalo."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self._stopping.is_set():
+                remaining = 0  # Al apagar, vaciar la cola sin esperar
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list, retries: int = 3):
+        for attempt in range(retries):
+            try:
+                with self.pool.connection() as conn:
+                    with conn:  # Un solo commit por lote
+                        conn.executemany(SQL_INSERTAR_PERFIL, batch)
+                        _guardar_condiciones(conn, batch)
+                        _sumar_resumenes(conn, batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except sqlite3.Error as e:
+                print(f"Error al guardar lote de {len(batch)} perfiles (intento {attempt + 1}): {e}")
+                time.sleep(0.1 * (attempt + 1))
+        self.failed += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            'running': self.running,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches
+        }
+
+
+PROFILE_WRITER = ProfileWriter(DB_POOL)
+
+
+def _existe_tabla(cursor, nombre: str) -> bool:
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).fetchone() is not None
+
+
+def crear_o_actualizar_tabla_perfiles(database: str = None):
     """
     Crea la tabla 'perfiles' si no existe.
     Define todos los campos necesarios para almacenar la información del formulario.
     """
-    conn = get_db_connection()
+    conn = get_db_connection(database)
     if conn:
         try:
             cursor = conn.cursor()
@@ -43,8 +316,45 @@ def crear_o_actualizar_tabla_perfiles():
                     fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+
+            # Condiciones normalizadas: una fila por (perfil, condición). El índice por
+            # condición convierte los filtros por condición en búsquedas por índice
+            # en vez de recorrer 'perfiles' con LIKE '%acne%'
+            existia_condiciones = _existe_tabla(cursor, 'perfil_condiciones')
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS perfil_condiciones (
+                    perfil_id INTEGER NOT NULL REFERENCES perfiles(id) ON DELETE CASCADE,
+                    condicion TEXT NOT NULL,
+                    PRIMARY KEY (perfil_id, condicion)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_perfil_condiciones_condicion
+                ON perfil_condiciones (condicion, perfil_id)
+            """)
+            if not existia_condiciones:
+                # Migración: separa una vez las condiciones de los perfiles ya guardados
+                cursor.executemany(SQL_INSERTAR_CONDICION, (
+                    (perfil_id, condicion)
+                    for perfil_id, condiciones in conn.execute("SELECT id, condiciones FROM perfiles")
+                    for condicion in separar_condiciones(condiciones)
+                ))
+
+            # Resúmenes para el dashboard (WITHOUT ROWID: la clave primaria es el propio índice)
+            existia_resumen = _existe_tabla(cursor, 'resumen_perfiles')
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS resumen_perfiles (
+                    dimension TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, valor)
+                ) WITHOUT ROWID
+            """)
+            if not existia_resumen:
+                # Migración: los perfiles guardados antes de existir la tabla se resumen una vez
+                reconstruir_resumenes(conn)
             conn.commit()
-            print(" Tabla 'perfiles' verificada/creada exitosamente en skinfit.db.")
+            print(f" Tabla 'perfiles' verificada/creada exitosamente en {database or DATABASE_NAME}.")
 
         except sqlite3.Error as e:
             print(f" Error al verificar/crear la tabla 'perfiles': {e}")
@@ -52,6 +362,69 @@ def crear_o_actualizar_tabla_perfiles():
             conn.close()
             # print("Conexión a la base de datos cerrada.")
 
+def reconstruir_resumenes(conn):
+    """
+    Recalcula resumen_perfiles desde cero a partir de 'perfiles'. Agrupa en
+    SQLite por cada columna, así en Python solo se recorren valores distintos.
+    """
+    conteos = Counter()
+    for dia, total in conn.execute(
+            "SELECT date(fecha_registro), COUNT(*) FROM perfiles GROUP BY 1"):
+        conteos['dia', dia] += total
+    for tipo_piel, total in conn.execute(
+            "SELECT lower(trim(tipo_piel)), COUNT(*) FROM perfiles GROUP BY 1"):
+        conteos['tipo_piel', tipo_piel] += total
+    for edad, total in conn.execute("SELECT edad, COUNT(*) FROM perfiles GROUP BY edad"):
+        conteos['edad', rango_edad(int(edad))] += total
+
+    conn.execute("DELETE FROM resumen_perfiles")
+    conn.executemany(
+        "INSERT INTO resumen_perfiles (dimension, valor, total) VALUES (?, ?, ?)",
+        [(dimension, valor, total) for (dimension, valor), total in conteos.items()]
+    )
+
+
+def obtener_resumen_perfiles() -> dict:
+    """
+    Totales de perfiles para el dashboard, leídos de resumen_perfiles:
+    {'tipo_piel': Counter, 'edad': Counter, 'dia': Counter}.
+    """
+    resumen = {dimension: Counter() for dimension in ('tipo_piel', 'edad', 'dia')}
+    with DB_POOL.connection() as conn:
+        for dimension, valor, total in conn.execute(
+                "SELECT dimension, valor, total FROM resumen_perfiles"):
+            if dimension in resumen:  # Las bases anteriores también guardaban 'condicion'
+                resumen[dimension][valor] = total
+    return resumen
+
+
+def contar_perfiles_por_condicion() -> Counter:
+    """Número de perfiles por condición (recorre solo el índice por condición)."""
+    with DB_POOL.connection() as conn:
+        return Counter(dict(conn.execute(
+            "SELECT condicion, COUNT(*) FROM perfil_condiciones GROUP BY condicion"
+        ).fetchall()))
+
+
+def contar_perfiles_con_condiciones(condiciones) -> int:
+    """
+    Número de perfiles que tienen TODAS las condiciones indicadas. Cada
+    condición es una búsqueda en idx_perfil_condiciones; no se usa LIKE.
+    """
+    condiciones = sorted({c.strip().lower() for c in condiciones if c.strip()})
+    if not condiciones:
+        return 0
+    marcadores = ', '.join('?' * len(condiciones))
+    with DB_POOL.connection() as conn:
+        return conn.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT perfil_id FROM perfil_condiciones
+                WHERE condicion IN ({marcadores})
+                GROUP BY perfil_id
+                HAVING COUNT(*) = ?
+            )
+        """, (*condiciones, len(condiciones))).fetchone()[0]
+
 # ----------------------------------------------------------------------
 #  EJECUCIÓN DEL MÓDULO (Para pruebas/setup manual)
 # ----------------------------------------------------------------------
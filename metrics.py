@@ -0,0 +1,211 @@
+# metrics.py
+# Instrumentación ligera: spans de tiempo por etapa, histogramas de latencia
+# (con p50/p95/p99) y contadores, exportados en formato de texto de Prometheus.
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource  # Solo en Unix
+except ImportError:
+    resource = None
+
+# Límites (en segundos) de los buckets de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Tiempos por etapa de la petición en curso (None fuera de una petición instrumentada)
+_REQUEST_TIMINGS = ContextVar('request_timings', default=None)
+
+
+class LatencyHistogram:
+    """
+    Histograma acumulativo al estilo Prometheus más una ventana de las
+    últimas `window` muestras para estimar p50/p95/p99.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 1024):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self) -> dict:
+        samples = sorted(self.recent)
+        if not samples:
+            return {}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"')) for k, v in labels)
+    return '{' + body + '}'
+
+
+class MetricsRegistry:
+    """Histogramas y contadores en memoria, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (nombre, etiquetas) -> LatencyHistogram
+        self._counters = {}    # (nombre, etiquetas) -> valor
+        self._help = {}
+        self._collectors = []
+
+    def observe(self, name: str, seconds: float, help_text: str = '', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+                self._help.setdefault(name, help_text)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, help_text: str = '', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def register_collector(self, collector):
+        """
+        Registra una función que devuelve métricas calculadas al exportar:
+        una lista de (nombre, tipo, ayuda, [(etiquetas_dict, valor), ...]).
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            help_texts = dict(self._help)
+
+            seen = set()
+            for (name, labels), histogram in histograms:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float('inf'),), histogram.bucket_counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+            seen = set()
+            for (name, labels), histogram in histograms:
+                quantile_name = f"{name}_quantile"
+                if quantile_name not in seen:
+                    seen.add(quantile_name)
+                    lines.append(f"# HELP {quantile_name} p50/p95/p99 de las últimas muestras de {name}")
+                    lines.append(f"# TYPE {quantile_name} gauge")
+                for q, value in histogram.quantiles().items():
+                    lines.append(f"{quantile_name}{_format_labels(labels + (('quantile', q),))} {value:.6f}")
+
+            seen = set()
+            for (name, labels), value in counters:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Mide una etapa: la agrega al histograma skinfit_stage_seconds y, si hay
+    una petición instrumentada en curso, a sus tiempos (para la cabecera).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe('skinfit_stage_seconds', elapsed, 'Latencia por etapa del procesamiento', stage=stage)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def start_request_timing():
+    """Empieza a acumular los tiempos por etapa de la petición actual."""
+    return _REQUEST_TIMINGS.set({})
+
+
+def finish_request_timing(token) -> dict:
+    """Devuelve los tiempos acumulados y deja de acumular."""
+    timings = _REQUEST_TIMINGS.get() or {}
+    _REQUEST_TIMINGS.reset(token)
+    return timings
+
+
+def process_memory_bytes() -> int:
+    """
+    Memoria residente (RSS) actual de este proceso. En Linux se lee de
+    /proc; en otros Unix se usa el máximo alcanzado (ru_maxrss) y donde no
+    hay ninguna de las dos fuentes (Windows) devuelve 0.
+    """
+    if hasattr(os, 'sysconf'):
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def process_private_memory_bytes() -> int:
+    """
+    Memoria privada del proceso (Private_Clean + Private_Dirty): lo que no
+    comparte con otros procesos, como las páginas del catálogo heredadas del
+    padre con fork(). Solo en Linux; en otros sistemas devuelve la RSS.
+    """
+    try:
+        total = 0
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total += int(line.split()[1]) * 1024
+        return total
+    except (OSError, ValueError, IndexError):
+        return process_memory_bytes()
+
+
+def server_timing_header(timings: dict, total: float) -> str:
+    """Valor para la cabecera Server-Timing (milisegundos), ej: 'rutina;dur=0.12, total;dur=8.40'."""
+    parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(parts)
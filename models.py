@@ -60,6 +60,16 @@ class RutinaPersonalizada:
         self.pasos = []  # Lista de pasos ordenados
         self.productos_recomendados = []  # Productos específicos del CSV
     
+    @classmethod
+    def desde_plantilla(cls, perfil: PerfilUsuario, pasos):
+        """
+        Crea la rutina a partir de pasos ya generados (plantilla compartida).
+        Solo se copia la lista: los pasos de la plantilla son de solo lectura.
+        """
+        rutina = cls(perfil)
+        rutina.pasos = list(pasos)
+        return rutina
+    
     def agregar_paso(self, nombre_paso: str, descripcion: str, tipo_producto: str = None):
         """Agrega un paso a la rutina con información del tipo de producto necesario"""
         self.pasos.append({
@@ -72,6 +82,6 @@ class RutinaPersonalizada:
     def to_dict(self):
         return {
             "perfil": self.perfil.to_dict(),
-            "pasos": self.pasos,
+            "pasos": [dict(paso) for paso in self.pasos],
             "productos_recomendados": self.productos_recomendados
         }
\ No newline at end of file
@@ -0,0 +1,234 @@
+# serve.py
+# Lanzador de producción con varios procesos (pre-fork).
+#
+# El proceso padre carga, limpia e indexa el catálogo una sola vez, abre el
+# socket y después crea los workers con fork(). Los workers heredan el
+# catálogo ya construido y lo comparten copy-on-write: como es de solo lectura
+# (arrays de numpy, categóricas y textos que nadie modifica), sus páginas no se
+# copian y la memoria propia de cada worker no depende del tamaño del catálogo.
+#
+# Si el CSV cambia (o el padre recibe SIGHUP), el padre reconstruye el catálogo
+# y reemplaza los workers uno por uno; los nuevos heredan la versión nueva.
+# SIGTERM o Ctrl+C detienen todos los workers.
+#
+# Solo en Unix (Linux, macOS): usa os.fork() y SIGHUP. En Windows, python app.py.
+#
+# Uso:
+#   python serve.py --workers 4 --port 5000
+#   SKINFIT_ASYNC_PROFILE_WRITES=1 python serve.py --workers 8
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+# Antes de importar app: los hilos de fondo se inician en cada worker
+os.environ['SKINFIT_PREFORK'] = '1'
+
+from werkzeug.serving import make_server
+
+from app import app, iniciar_servicios_de_fondo
+from ai_service.catalog import CATALOG_MANAGER
+from ai_service.search import get_search_index
+from ai_service.similar import get_similar_index
+from database import PROFILE_WRITER, crear_o_actualizar_tabla_perfiles
+
+logger = logging.getLogger('serve')
+
+
+def _run_worker(sock, host: str, port: int, graceful_timeout: float):
+    """
+    Proceso hijo: atiende peticiones en el socket heredado hasta recibir
+    SIGTERM. Entonces deja de aceptar conexiones (las siguientes las toman
+    los demás workers) y espera, hasta graceful_timeout segundos, a que
+    terminen las peticiones en curso, incluidas las respuestas en streaming.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # El padre decide cuándo terminar
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    iniciar_servicios_de_fondo(revisar_catalogo=False)
+
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+
+    # Los hilos de petición de werkzeug son daemon y server_close() no los
+    # espera: se registran aquí para poder esperarlos antes de salir
+    active = set()
+    handle = server.process_request_thread
+
+    def tracked(request, client_address):
+        active.add(threading.current_thread())
+        try:
+            handle(request, client_address)
+        finally:
+            active.discard(threading.current_thread())
+
+    server.process_request_thread = tracked
+
+    # shutdown() espera a que serve_forever() termine: desde el manejador
+    # (que corre en este mismo hilo) se bloquearía, por eso va en otro hilo
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+        deadline = time.monotonic() + graceful_timeout
+        for thread in list(active):
+            thread.join(max(0.0, deadline - time.monotonic()))
+        if active:
+            logger.warning("Worker %d sale con %d peticiones sin terminar", os.getpid(), len(active))
+    finally:
+        server.server_close()
+        PROFILE_WRITER.stop()
+
+
+class Arbiter:
+    """
+    Proceso padre: mantiene `workers` procesos vivos, revisa el catálogo y,
+    cuando cambia, reemplaza los workers para que hereden la versión nueva.
+    """
+
+    def __init__(self, sock, host: str, port: int, workers: int, poll_interval: float,
+                 graceful_timeout: float = 10.0):
+        self.sock = sock
+        self.host = host
+        self.port = port
+        self.size = workers
+        self.poll_interval = poll_interval
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}      # pid -> versión del catálogo que heredó
+        self.retiring = set()  # pids a los que ya se les pidió terminar
+        self.stopping = False
+        self.reload_requested = False
+        if poll_interval > 0:
+            # Los workers heredan esto con fork: /admin/catalogo informa que el padre revisa el CSV
+            CATALOG_MANAGER.external_poller = f'arbiter (pid {os.getpid()})'
+            CATALOG_MANAGER.poll_interval = poll_interval
+
+    def spawn(self) -> int:
+        # Objetos actuales a la generación permanente: el GC de los workers no
+        # los recorre ni escribe en sus páginas, que siguen compartidas
+        gc.collect()
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                _run_worker(self.sock, self.host, self.port, self.graceful_timeout)
+            except BaseException:
+                logger.exception("Worker %d terminó con error", os.getpid())
+                status = 1
+            finally:
+                os._exit(status)
+        self.workers[pid] = CATALOG_MANAGER.current.version
+        logger.info("Worker %d iniciado (catálogo v%d)", pid, self.workers[pid])
+        return pid
+
+    def reap(self):
+        """Recoge los workers que terminaron y reemplaza los que murieron sin pedirlo."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.workers.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+            elif not self.stopping:
+                logger.warning("Worker %d terminó inesperadamente (estado %d); se reemplaza", pid, status)
+                self.spawn()
+
+    def retire(self, pid: int):
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def roll(self):
+        """Reemplaza, uno por uno, los workers con una versión anterior del catálogo."""
+        version = CATALOG_MANAGER.current.version
+        for pid, worker_version in list(self.workers.items()):
+            if worker_version != version and pid not in self.retiring:
+                self.spawn()
+                self.retire(pid)
+
+    def check_catalog(self):
+        try:
+            if CATALOG_MANAGER.reload(force=self.reload_requested):
+                logger.info("Catálogo v%d cargado; reemplazando workers", CATALOG_MANAGER.current.version)
+                self.roll()
+        except Exception as e:
+            CATALOG_MANAGER.last_error = str(e)
+            logger.error("No se pudo recargar el catálogo; los workers siguen con la versión anterior: %s", e)
+        self.reload_requested = False
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _handle_hup(self, signum, frame):
+        self.reload_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_hup)
+
+        for _ in range(self.size):
+            self.spawn()
+
+        next_poll = time.monotonic() + self.poll_interval
+        while not self.stopping:
+            self.reap()
+            if self.reload_requested or (self.poll_interval > 0 and time.monotonic() >= next_poll):
+                self.check_catalog()
+                next_poll = time.monotonic() + self.poll_interval
+            time.sleep(0.5)
+        self.stop()
+
+    def stop(self):
+        """Pide a todos los workers que terminen; los que no lo hagan a tiempo se matan."""
+        logger.info("Deteniendo %d workers", len(self.workers))
+        for pid in list(self.workers):
+            self.retire(pid)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Worker %d no terminó a tiempo; se mata", pid)
+            os.kill(pid, signal.SIGKILL)
+        while self.workers:
+            pid, _ = os.waitpid(-1, 0)
+            self.workers.pop(pid, None)
+        self.sock.close()
+
+
+def main():
+    if not hasattr(os, 'fork') or not hasattr(signal, 'SIGHUP'):
+        sys.exit("serve.py necesita os.fork() y SIGHUP (Linux o macOS). En Windows usa: python app.py")
+
+    parser = argparse.ArgumentParser(description='SkinFit con varios procesos y catálogo compartido')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--backlog', type=int, default=128)
+    args = parser.parse_args()
+
+    crear_o_actualizar_tabla_perfiles()
+    # Índices derivados del catálogo: se arman antes del fork para que los workers los compartan
+    get_search_index()
+    get_similar_index()
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    sock.set_inheritable(True)
+    print(f"🚀 SkinFit en http://{args.host}:{args.port} con {args.workers} workers "
+          f"(catálogo v{CATALOG_MANAGER.current.version}, {len(CATALOG_MANAGER.current)} productos)")
+
+    Arbiter(sock, args.host, args.port, args.workers, app.config['CATALOG_POLL_SECONDS']).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# tests/test_serve.py
+# Recarga con serve.py: las peticiones en curso terminan aunque su worker
+# se reemplace.
+
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+SERVE = os.path.join(os.path.dirname(__file__), '..', 'serve.py')
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="serve.py necesita os.fork()")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"serve.py no abrió el puerto {port}")
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = _free_port()
+    env = dict(os.environ, SKINFIT_CATALOG_POLL_SECONDS='0')
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(SERVE), '--host', '127.0.0.1', '--port', str(port), '--workers', '1'],
+        cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port(port)
+        yield process, port
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(30)
+
+
+def test_batch_stream_completes_across_reload(server):
+    process, port = server
+    perfiles = [
+        {'id': i, 'tipo_piel': ('grasa', 'seca', 'mixta')[i % 3], 'condiciones': ['acne'] if i % 2 else [],
+         'frecuencia_rutina': ('basica', 'intermedia', 'avanzada')[i % 3]}
+        for i in range(5000)
+    ]
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/api/recommend/batch', json.dumps({'profiles': perfiles}),
+                 {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    assert response.status == 200
+
+    # Lectura lenta: la respuesta sigue abierta cuando el padre recarga y retira al worker
+    indices = []
+    reloaded = False
+    while True:
+        line = response.readline()
+        if not line:
+            break
+        indices.append(json.loads(line)['index'])
+        if len(indices) % 100 == 0:
+            time.sleep(0.02)
+        if not reloaded and len(indices) >= 500:
+            os.kill(process.pid, signal.SIGHUP)
+            reloaded = True
+
+    assert reloaded
+    assert indices == list(range(len(perfiles)))